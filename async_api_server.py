@@ -0,0 +1,192 @@
+import os
+import asyncio
+import logging
+import config
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.exceptions import HTTPException
+from starlette.staticfiles import StaticFiles
+
+from submission_service import get_submission_service, public_submission
+from upload_spool import UploadSpool, UploadError
+
+logger = logging.getLogger(__name__)
+
+MAX_PHOTO_BYTES = 16 * 1024 * 1024
+WEBAPP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webapp')
+
+class SPAStaticFiles(StaticFiles):
+    """Serve webapp files; any other non-API path falls back to index.html"""
+    async def get_response(self, path, scope):
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as e:
+            if e.status_code != 404 or path.startswith('api/'):
+                raise
+            return await super().get_response('index.html', scope)
+
+def _too_busy(message):
+    return JSONResponse(
+        {"error": message},
+        status_code=429,
+        headers={"Retry-After": str(config.API_RETRY_AFTER_SECONDS)},
+    )
+
+def _upload_error(e):
+    body = {"error": str(e)}
+    if e.offset is not None:
+        body["offset"] = e.offset
+    return JSONResponse(body, status_code=e.status)
+
+def create_async_app():
+    """Async version of test_api_server.create_app(): same routes, Google work goes through the submission queue"""
+    service = get_submission_service()
+    queue = service.queue
+    slots = asyncio.Semaphore(config.API_MAX_CONCURRENCY)
+    spool = UploadSpool(max_bytes=MAX_PHOTO_BYTES)
+    last_purge = 0.0
+    purge_task = None
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        if purge_task is not None:
+            purge_task.cancel()
+
+    app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+
+    async def queue_submission(form_dict, image_bytes):
+        try:
+            result = await service.submit_async(form_dict, image_bytes, form_dict.pop('submission_uuid', None))
+        except Exception as e:
+            logger.error(f"Error ocurred while queueing submission: {e}")
+            return JSONResponse({"error": "could not queue submission"}, status_code=500)
+
+        if result.errors:
+            return JSONResponse({"error": "validation failed", "errors": list(result.errors)}, status_code=400)
+
+        if result.duplicate:
+            return JSONResponse({"status": True, "duplicate": True, "submission_id": result.submission_id})
+
+        return JSONResponse({"row": result.row, "status": True, "queued": True, "submission_id": result.submission_id}, status_code=202)
+
+    @app.post("/api/append-to-sheet")
+    async def drive_then_sheet(request: Request):
+        # Shed load before reading the body: too many requests in flight or a backed-up queue
+        if slots.locked():
+            return _too_busy("server busy")
+        if config.API_MAX_PENDING and await asyncio.to_thread(queue.pending_count) >= config.API_MAX_PENDING:
+            return _too_busy("submission queue full")
+
+        content_length = request.headers.get('content-length')
+        if content_length and content_length.isdigit() and int(content_length) > MAX_PHOTO_BYTES + 64 * 1024:
+            return JSONResponse({"error": "file too large"}, status_code=413)
+
+        async with slots:
+            # Parsed as a stream; the photo part is spooled to a temp file rather than buffered whole
+            async with request.form(max_files=1, max_fields=50) as form:
+                foto_evidence = form.get("foto_evidence")
+                if foto_evidence is None or isinstance(foto_evidence, str):
+                    return JSONResponse({"error": "image required"}, status_code=400)
+                if foto_evidence.size and foto_evidence.size > MAX_PHOTO_BYTES:
+                    return JSONResponse({"error": "file too large"}, status_code=413)
+
+                form_dict = {key: value for key, value in form.items() if isinstance(value, str)}
+                image_bytes = await foto_evidence.read()
+
+            return await queue_submission(form_dict, image_bytes)
+
+    # ========== CHUNKED UPLOADS ==========
+    # POST /api/uploads {"size"} -> upload_id; PUT /api/uploads/{id}?offset=N with raw bytes, repeated;
+    # GET /api/uploads/{id} returns the offset to resume from; POST .../finalize with the form fields queues it.
+
+    @app.post("/api/uploads")
+    async def upload_init(request: Request):
+        nonlocal last_purge, purge_task
+        try:
+            body = await request.json()
+            size = int(body.get("size") or 0)
+        except (ValueError, TypeError, AttributeError):
+            return JSONResponse({"error": "size required"}, status_code=400)
+
+        loop = asyncio.get_running_loop()
+        if loop.time() - last_purge > 3600:
+            last_purge = loop.time()
+            # Kept so it isn't garbage collected mid-run, and cancelled on shutdown
+            purge_task = asyncio.create_task(asyncio.to_thread(spool.purge))
+
+        try:
+            upload_id = await asyncio.to_thread(spool.create, size, body.get("filename"), body.get("mimetype"))
+        except UploadError as e:
+            return _upload_error(e)
+        return JSONResponse(
+            {"upload_id": upload_id, "offset": 0, "chunk_size": config.UPLOAD_CHUNK_MAX_BYTES}, status_code=201
+        )
+
+    @app.get("/api/uploads/{upload_id}")
+    async def upload_status(upload_id: str):
+        try:
+            info = await asyncio.to_thread(spool.info, upload_id)
+        except UploadError as e:
+            return _upload_error(e)
+        return {"upload_id": upload_id, "offset": info["offset"], "size": info["size"]}
+
+    @app.put("/api/uploads/{upload_id}")
+    async def upload_chunk(upload_id: str, offset: int, request: Request):
+        # At most one chunk is buffered per request
+        chunk = bytearray()
+        async for part in request.stream():
+            chunk += part
+            if len(chunk) > config.UPLOAD_CHUNK_MAX_BYTES:
+                return JSONResponse({"error": "chunk too large"}, status_code=413)
+
+        try:
+            new_offset = await asyncio.to_thread(spool.write, upload_id, offset, bytes(chunk))
+        except UploadError as e:
+            return _upload_error(e)
+        return {"upload_id": upload_id, "offset": new_offset}
+
+    @app.post("/api/uploads/{upload_id}/finalize")
+    async def upload_finalize(upload_id: str, request: Request):
+        if slots.locked():
+            return _too_busy("server busy")
+        if config.API_MAX_PENDING and await asyncio.to_thread(queue.pending_count) >= config.API_MAX_PENDING:
+            return _too_busy("submission queue full")
+
+        async with slots:
+            async with request.form(max_files=0, max_fields=50) as form:
+                form_dict = {key: value for key, value in form.items() if isinstance(value, str)}
+
+            try:
+                image_bytes, _ = await asyncio.to_thread(spool.read_complete, upload_id)
+            except UploadError as e:
+                return _upload_error(e)
+
+            response = await queue_submission(form_dict, image_bytes)
+            if response.status_code < 300:
+                # Queued (or a duplicate): the bytes now live in the submission queue.
+                # A rejected form keeps its upload so the corrected form can be finalized again.
+                await asyncio.to_thread(spool.discard, upload_id)
+            return response
+
+    @app.get("/api/submissions/{submission_id}")
+    async def submission_status(submission_id: int):
+        submission = await asyncio.to_thread(queue.get, submission_id)
+        if not submission:
+            return JSONResponse({"error": "not found"}, status_code=404)
+        return public_submission(submission)
+
+    @app.get("/api/metrics")
+    async def submission_metrics():
+        return await asyncio.to_thread(service.stats)
+
+    app.mount("/", SPAStaticFiles(directory=WEBAPP_DIR, html=True), name="webapp")
+
+    return app
+
+# Dev entrypoint
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(create_async_app(), host="127.0.0.1", port=5000)
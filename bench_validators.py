@@ -0,0 +1,73 @@
+"""Micro-benchmark: cost of validating one complete form with DataValidator.
+
+Run with: python bench_validators.py
+Logging is set up like main.py (INFO), with output discarded, so log formatting cost is included.
+"""
+import io
+import sys
+import timeit
+import logging
+
+from validators import DataValidator
+
+VISIT_FORM = {
+    'kode_sa': 'sa001',
+    'nama': 'budi santoso',
+    'no_telp': '0812-3456-7890',
+    'witel': 'Jatim Barat',
+    'telda': 'madiun',
+    'tanggal': '15/08/2025',
+    'kategori': 'desa',
+    'kegiatan': 'visit',
+    'tenant': 'desa sukamaju',
+    'layanan': 'indihome',
+    'tarif': '< Rp 200.000',
+    'nama_pic': 'siti aminah',
+    'jabatan_pic': 'kepala desa',
+    'telepon_pic': '81234567890',  # needs auto-formatting
+}
+
+DEALING_FORM = dict(VISIT_FORM, kegiatan='Dealing', paket_deal='100 Mbps', deal_bundling='2P Internet + TV',
+                    telepon_pic='+6281234567890')
+
+def validate_form(form):
+    v = DataValidator
+    v.validate_kode_sa(form['kode_sa'])
+    v.validate_nama(form['nama'])
+    v.validate_telepon(form['no_telp'])
+    v.validate_witel(form['witel'])
+    v.validate_telda(form['telda'])
+    v.validate_tanggal(form['tanggal'])
+    v.validate_kategori(form['kategori'])
+    v.validate_kegiatan(form['kegiatan'])
+    v.validate_tenant(form['tenant'])
+    if form['kegiatan'].lower() == 'visit':
+        v.validate_layanan(form['layanan'])
+        v.validate_tarif(form['tarif'])
+    else:
+        v.validate_paket(form['paket_deal'])
+        v.validate_bundling(form['deal_bundling'])
+    v.validate_nama_pic(form['nama_pic'])
+    v.validate_jabatan_pic(form['jabatan_pic'])
+    v.validate_telepon_pic(form['telepon_pic'])
+
+def bench(label, func, number=20000, repeat=5):
+    best = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    print(f"{label:<40} {best * 1e6:8.2f} µs/form")
+
+def main():
+    logging.basicConfig(
+        stream=io.StringIO(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    print(f"Python {sys.version.split()[0]}")
+    bench("visit form (INFO logging)", lambda: validate_form(VISIT_FORM))
+    bench("dealing form (INFO logging)", lambda: validate_form(DEALING_FORM))
+
+    logging.getLogger().setLevel(logging.WARNING)
+    bench("visit form (WARNING logging)", lambda: validate_form(VISIT_FORM))
+    bench("dealing form (WARNING logging)", lambda: validate_form(DEALING_FORM))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Bulk import of offline visits from CSV/XLSX plus a folder of evidence photos.
+
+    python bulk_import.py visits.csv --photos ./foto
+    python bulk_import.py visits.xlsx --photos ./foto --chunk-size 500 --workers 8
+    python bulk_import.py visits.csv --photos ./foto --dry-run
+
+Columns may use the form keys (kode_sa, nama, ...) or the sheet header labels; the photo column
+(foto_evidence / "Foto Evidence Visit") holds a file name inside --photos.
+Progress is checkpointed after every chunk, so re-running the same command resumes where it stopped.
+"""
+import os
+import io
+import csv
+import json
+import logging
+import argparse
+import itertools
+import config
+
+import form_schema
+import photo_store
+import image_processing
+from concurrent.futures import ThreadPoolExecutor
+from googleservice import get_google_service
+from submission_service import SubmissionService
+
+try:
+    import openpyxl
+except ImportError:  # Only needed for .xlsx input
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+PHOTO_FIELD = form_schema.FIELD_NAMES[-1]
+HEADER_TO_FIELD = {field.header.lower(): field.name for field in form_schema.FORM_FIELDS}
+
+# ========== INPUT ==========
+
+def _field_name(column):
+    column = str(column or '').strip()
+    return column if column in form_schema.FIELD_NAMES else HEADER_TO_FIELD.get(column.lower(), column)
+
+def read_rows(path):
+    """Stream the input file as dicts keyed by form field name"""
+    if path.lower().endswith('.xlsx'):
+        if openpyxl is None:
+            raise RuntimeError("Reading .xlsx files requires the 'openpyxl' package")
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            columns = [_field_name(column) for column in next(rows, ())]
+            for values in rows:
+                if any(value not in (None, '') for value in values):
+                    # data_only cells are datetime/float; make them the text a CSV export would hold
+                    yield dict(zip(columns, (form_schema.cell_text(value) for value in values)))
+        finally:
+            workbook.close()
+        return
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        columns = [_field_name(column) for column in next(reader, [])]
+        for values in reader:
+            if any(values):
+                yield dict(zip(columns, values))
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+# ========== CHECKPOINT ==========
+
+class Checkpoint:
+    """Resumable progress, rewritten atomically after every step that talks to Google"""
+    def __init__(self, path):
+        self.path = path
+        self.next_row = 0      # rows before this index are fully handled
+        self.file_ids = {}     # row index -> reserved Drive id for the chunk in progress
+        self.appended = None   # {'start', 'range', 'rows'} once the chunk in progress is on the sheet
+        self.imported = 0
+        self.rejected = 0
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+            self.next_row = state['next_row']
+            self.file_ids = {int(index): file_id for index, file_id in state['file_ids'].items()}
+            self.appended = state.get('appended')
+            self.imported = state['imported']
+            self.rejected = state['rejected']
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'next_row': self.next_row,
+                'file_ids': self.file_ids,
+                'appended': self.appended,
+                'imported': self.imported,
+                'rejected': self.rejected,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+# ========== IMPORT ==========
+
+class BulkImporter:
+    def __init__(self, input_path, photos_dir, chunk_size=500, workers=None, dry_run=False):
+        self.input_path = input_path
+        self.photos_dir = photos_dir
+        self.chunk_size = chunk_size
+        self.workers = workers or config.GOOGLE_MAX_WORKERS
+        self.dry_run = dry_run
+
+        self.checkpoint = Checkpoint(f"{input_path}.checkpoint.json")
+        self.errors_path = f"{input_path}.errors.csv"
+        self.google_service = None if dry_run else get_google_service()
+        self.photos = None if dry_run else photo_store.get_photo_store()
+
+    def _photo_path(self, name):
+        if not name:
+            return None
+        # Only plain file names inside the photo folder are accepted
+        path = os.path.join(self.photos_dir, os.path.basename(str(name).strip()))
+        return path if os.path.isfile(path) else None
+
+    def _upload(self, index, values, photo_path):
+        """Normalise and upload one photo; the reserved id makes a resumed upload a no-op (409).
+
+        Returns the Drive link, or None if this row failed so the rest of the chunk carries on.
+        """
+        try:
+            with open(photo_path, 'rb') as f:
+                image_bytes, mimetype = image_processing.normalize_image(f.read())
+
+            # A photo that is already on Drive (same bytes) is linked instead of uploaded again
+            digest = photo_store.content_digest(image_bytes)
+            known = self.photos.lookup(digest)
+            if known:
+                return known[1]
+
+            file_id = self.checkpoint.file_ids.get(index)
+            folder_id = self.google_service.drive_folder(values.get('witel'), values.get('tanggal'))
+            link = self.google_service.upload_to_drive(
+                io.BytesIO(image_bytes), SubmissionService.image_name(values, mimetype), mimetype, file_id, folder_id
+            )
+            self.photos.remember(digest, file_id, link)
+            return link
+
+        except Exception as e:
+            logger.error(f"Row {index + 2}: upload of {photo_path} failed: {e}")
+            return None
+
+    def _reserve_file_ids(self, indexes):
+        for index in indexes:
+            if index not in self.checkpoint.file_ids:
+                file_id = self.google_service.allocate_drive_file_id()
+                # Not checkpointed on failure: this row uploads without a reserved id, a resume tries again
+                if file_id:
+                    self.checkpoint.file_ids[index] = file_id
+        self.checkpoint.save()
+
+    def import_chunk(self, start, records, report_writer):
+        report, values = form_schema.validate_many(records)
+
+        photo_paths = {}
+        for offset, record in enumerate(records):
+            if offset in report:
+                continue
+            photo_path = self._photo_path(record.get(PHOTO_FIELD))
+            if photo_path is None:
+                report[offset] = [f"Foto tidak ditemukan: {record.get(PHOTO_FIELD) or '-'}"]
+            else:
+                photo_paths[offset] = photo_path
+
+        if not self.dry_run and photo_paths:
+            self._reserve_file_ids(start + offset for offset in photo_paths)
+
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bulk-upload') as pool:
+                links = dict(zip(photo_paths, pool.map(
+                    lambda offset: self._upload(start + offset, values[offset], photo_paths[offset]), photo_paths
+                )))
+
+            rows = []
+            for offset, link in links.items():
+                if link:
+                    rows.append(SubmissionService.build_row(values[offset], link))
+                else:
+                    report[offset] = ["Upload foto ke Google Drive gagal"]
+
+            # One values().append per chunk instead of one per row
+            appended = self.checkpoint.appended
+            if appended and appended['start'] == start:
+                # Appended before an interrupted run could advance next_row; don't write the chunk twice
+                logger.info(f"Chunk at row {start + 2} already appended: {appended['range']}")
+            elif rows:
+                updated_range = self.google_service.append_rows(rows)
+                logger.info(f"Appended {len(rows)} rows: {updated_range}")
+                # Recorded before anything else can fail, so a resume skips the append
+                self.checkpoint.appended = {'start': start, 'range': updated_range, 'rows': len(rows)}
+                self.checkpoint.imported += len(rows)
+                self.checkpoint.save()
+
+        for offset, errors in sorted(report.items()):
+            # +2: spreadsheet-style row number, counting the header row
+            report_writer.writerow([start + offset + 2, records[offset].get('kode_sa') or '-', '; '.join(errors)])
+
+        self.checkpoint.rejected += len(report)
+        self.checkpoint.next_row = start + len(records)
+        self.checkpoint.file_ids = {}
+        self.checkpoint.appended = None
+        if not self.dry_run:
+            self.checkpoint.save()
+
+    def run(self):
+        start = self.checkpoint.next_row
+        if start:
+            logger.info(f"Resuming {self.input_path} from row {start + 2}")
+
+        rows = itertools.islice(read_rows(self.input_path), start, None)
+        with open(self.errors_path, 'a' if start else 'w', newline='', encoding='utf-8') as f:
+            report_writer = csv.writer(f)
+            if not start:
+                report_writer.writerow(['baris', 'kode_sa', 'error'])
+
+            for records in chunked(rows, self.chunk_size):
+                self.import_chunk(start, records, report_writer)
+                f.flush()
+                start += len(records)
+                logger.info(f"{start} rows processed ({self.checkpoint.imported} imported, {self.checkpoint.rejected} rejected)")
+
+        return self.checkpoint.imported, self.checkpoint.rejected
+
+def main():
+    parser = argparse.ArgumentParser(description="Import offline visit/dealing data into the Google Sheet")
+    parser.add_argument('input', help="CSV or XLSX file")
+    parser.add_argument('--photos', required=True, help="Folder with the evidence photos named in the photo column")
+    parser.add_argument('--chunk-size', type=int, default=500, help="Rows per values().append call")
+    parser.add_argument('--workers', type=int, default=None, help="Parallel photo uploads")
+    parser.add_argument('--dry-run', action='store_true', help="Only validate and write the error report")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    importer = BulkImporter(args.input, args.photos, args.chunk_size, args.workers, args.dry_run)
+    imported, rejected = importer.run()
+    print(f"✅ {imported} rows imported, ❌ {rejected} rows rejected (see {importer.errors_path})")
+
+if __name__ == '__main__':
+    main()
@@ -10,3 +10,80 @@ SHEET_ID = os.getenv('SHEET_ID')
 DRIVE_FOLDER_ID = os.getenv('DRIVE_FOLDER_ID')
 CREDENTIALSJSON = os.getenv('CREDENTIALSJSON')
 WEBAPP_URL = "https://miniapp-rlegs.netlify.app/"
+
+# Concurrency
+GOOGLE_MAX_WORKERS = int(os.getenv('GOOGLE_MAX_WORKERS', '8'))
+BOT_CONCURRENT_UPDATES = int(os.getenv('BOT_CONCURRENT_UPDATES', '64'))
+
+# Sheet write batching
+SHEET_BATCH_WINDOW_MS = int(os.getenv('SHEET_BATCH_WINDOW_MS', '200'))
+SHEET_BATCH_MAX_ROWS = int(os.getenv('SHEET_BATCH_MAX_ROWS', '50'))
+
+# Evidence photo processing (needs Pillow; photos pass through unchanged without it)
+IMAGE_PROCESSING_ENABLED = os.getenv('IMAGE_PROCESSING_ENABLED', 'true').lower() == 'true'
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', '1600'))
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'JPEG').upper()  # JPEG, WEBP or PNG
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '80'))
+IMAGE_KEEP_CAPTURE_TIME = os.getenv('IMAGE_KEEP_CAPTURE_TIME', 'true').lower() == 'true'
+IMAGE_KEEP_GPS = os.getenv('IMAGE_KEEP_GPS', 'false').lower() == 'true'
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+
+# Drive file ids reserved per files().generateIds call
+DRIVE_ID_BATCH = int(os.getenv('DRIVE_ID_BATCH', '50'))
+
+# Durable submission queue
+QUEUE_DB_PATH = os.getenv('QUEUE_DB_PATH', 'data/submissions.sqlite3')
+QUEUE_WORKERS = int(os.getenv('QUEUE_WORKERS', '4'))
+QUEUE_RETRY_BASE_SECONDS = float(os.getenv('QUEUE_RETRY_BASE_SECONDS', '5'))
+QUEUE_RETRY_MAX_SECONDS = float(os.getenv('QUEUE_RETRY_MAX_SECONDS', '1800'))
+QUEUE_MAX_ATTEMPTS = int(os.getenv('QUEUE_MAX_ATTEMPTS', '50'))
+QUEUE_LEASE_SECONDS = float(os.getenv('QUEUE_LEASE_SECONDS', '300'))
+DEDUP_CACHE_SIZE = int(os.getenv('DEDUP_CACHE_SIZE', '10000'))
+
+# Bot update delivery: 'polling' (default) or 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')  # public https base URL, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '1'))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+# Async submission API backpressure
+API_MAX_CONCURRENCY = int(os.getenv('API_MAX_CONCURRENCY', '32'))
+API_MAX_PENDING = int(os.getenv('API_MAX_PENDING', '5000'))  # 0 disables the queue depth check
+API_RETRY_AFTER_SECONDS = int(os.getenv('API_RETRY_AFTER_SECONDS', '5'))
+
+# Conversation sessions: idle sessions are evicted, total estimated size is capped (least recently used first)
+SESSION_IDLE_TIMEOUT_SECONDS = int(os.getenv('SESSION_IDLE_TIMEOUT_SECONDS', '21600'))
+SESSION_MAX_BYTES = int(os.getenv('SESSION_MAX_BYTES', str(64 * 1024 * 1024)))
+SESSION_SWEEP_INTERVAL_SECONDS = int(os.getenv('SESSION_SWEEP_INTERVAL_SECONDS', '60'))
+
+# Session persistence: '' (memory only), 'memory', 'sqlite' or 'redis'
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', '')
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'data/sessions.sqlite3')
+SESSION_REDIS_URL = os.getenv('SESSION_REDIS_URL', 'redis://localhost:6379/0')
+SESSION_FLUSH_DELAY_MS = int(os.getenv('SESSION_FLUSH_DELAY_MS', '100'))
+
+# Chunked photo uploads: partial files are spooled to disk until finalized
+UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR', 'data/uploads')
+UPLOAD_CHUNK_MAX_BYTES = int(os.getenv('UPLOAD_CHUNK_MAX_BYTES', str(1024 * 1024)))
+UPLOAD_SPOOL_TTL_SECONDS = int(os.getenv('UPLOAD_SPOOL_TTL_SECONDS', '86400'))
+
+# Drive media uploads are sent in chunks of this size (multiple of 256 KiB); failed chunks are retried in place
+DRIVE_UPLOAD_CHUNK_BYTES = int(os.getenv('DRIVE_UPLOAD_CHUNK_BYTES', str(1024 * 1024)))
+
+# Content-addressed index of uploaded photos (SHA-256 -> Drive file), consulted before every upload
+PHOTO_STORE_DB_PATH = os.getenv('PHOTO_STORE_DB_PATH', 'data/photos.sqlite3')
+
+# Evidence photos are filed under DRIVE_FOLDER_ID / <Witel> / <YYYY-MM>; folder ids are cached in this file
+DRIVE_PARTITION_FOLDERS = os.getenv('DRIVE_PARTITION_FOLDERS', 'true').lower() == 'true'
+DRIVE_FOLDER_CACHE_PATH = os.getenv('DRIVE_FOLDER_CACHE_PATH', 'data/drive_folders.json')
+
+# Google API limits per process (token buckets) and retries of 429/5xx responses
+SHEETS_REQUESTS_PER_MINUTE = int(os.getenv('SHEETS_REQUESTS_PER_MINUTE', '60'))
+DRIVE_REQUESTS_PER_MINUTE = int(os.getenv('DRIVE_REQUESTS_PER_MINUTE', '600'))
+GOOGLE_MAX_RETRIES = int(os.getenv('GOOGLE_MAX_RETRIES', '6'))
+GOOGLE_RETRY_BASE_SECONDS = float(os.getenv('GOOGLE_RETRY_BASE_SECONDS', '1'))
+GOOGLE_RETRY_MAX_SECONDS = float(os.getenv('GOOGLE_RETRY_MAX_SECONDS', '64'))
@@ -4,22 +4,33 @@ from session_manager import SessionManager
 from conversation_states import ConversationState
 from validators import DataValidator
 import logging
+import functools
 from io import BytesIO
-import base64
-from googleservice import GoogleService
+from submission_service import get_submission_service
 
 
 logger = logging.getLogger(__name__)
 
+def saves_session(handler):
+    """Persist the user's session after the handler, even if it fails (as handle_interactions does)"""
+    @functools.wraps(handler)
+    async def wrapper(self, update, context):
+        try:
+            return await handler(self, update, context)
+        finally:
+            self.session_manager.save(update.effective_user.id)
+    return wrapper
+
 class ConversationHandler:
     """Main handler untuk conversation flow dengan inline keyboard support"""
     
     def __init__(self):
         self.session_manager = SessionManager()
         self.validator = DataValidator()
-        self.googleservices = GoogleService()
+        self.submission_service = get_submission_service()
         self.stack_history = []
     
+    @saves_session
     async def start_conversation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start new conversation - bisa dari command atau callback"""
         # Handle both regular message and callback query
@@ -35,10 +46,7 @@ class ConversationHandler:
         
         # Reset any existing session
         self.session_manager.reset_session(user_id)
-        session = self.session_manager.get_session(user_id)
-
-        self.googleservices.authenticate()
-        self.googleservices.build_services()
+        session = await self.session_manager.get_session_async(user_id)
 
         # Set state to waiting for Kode SA
         session.set_state(ConversationState.WAITING_KODE_SA)
@@ -52,14 +60,15 @@ class ConversationHandler:
         await send_message(welcome_message, parse_mode='Markdown')
         logger.info(f"Started conversation for user {user_id} ({user_name})")
     
+    @saves_session
     async def handle_image(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         photo = update.message.photo[-1]
         
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
 
         if session.state == ConversationState.WAITING_FOTO_EVIDENCE:
-            await self._handle_image(update, session, photo)
+            await self._handle_image(update, session, photo, context)
     
 
     # There is a way to merge button_callback and handle_message update is reset for each interaction, in text callback_query is None and in button, message is None. Use that as the saving grace
@@ -194,12 +203,13 @@ class ConversationHandler:
             # Back to main menu
             await self.handle_back_to_menu(update, context)
 
+    @saves_session
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle incoming message based on conversation state"""
         user_id = update.effective_user.id
         user_message = update.message.text.strip()
         
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
 
         if session.state == ConversationState.WAITING_KODE_SA:
             await self._handle_kode_sa(update, session, user_message)
@@ -347,13 +357,14 @@ Lengkapi setiap pertanyaan yang diberikan dan data akan otomatis tersimpan.
         
         await update.message.reply_text(next_step, parse_mode='Markdown', reply_markup=reply_markup)
     
+    @saves_session
     async def handle_witel_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle Witel selection dari inline keyboard"""
         query = update.callback_query
         await query.answer()
         
         user_id = query.from_user.id
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
         
         # Extract witel name from callback_data
         witel_map = {
@@ -448,13 +459,14 @@ Lengkapi setiap pertanyaan yang diberikan dan data akan otomatis tersimpan.
         
         await update.message.reply_text(next_step, parse_mode='Markdown', reply_markup=reply_markup)
     
+    @saves_session
     async def handle_kategori_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle Kategori Pelanggan selection dari inline keyboard"""
         query = update.callback_query
         await query.answer()
         
         user_id = query.from_user.id
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
         
         # Extract Category name from callback_data
         category_map = {
@@ -516,13 +528,14 @@ Lengkapi setiap pertanyaan yang diberikan dan data akan otomatis tersimpan.
         
         await update.message.reply_text(next_step, parse_mode='Markdown', reply_markup=reply_markup)
     
+    @saves_session
     async def handle_kegiatan_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle Kategori Kegiatan selection dari inline keyboard"""
         query = update.callback_query
         await query.answer()
         
         user_id = query.from_user.id
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
         
         # Extract Category name from callback_data
         kegiatan_map = {
@@ -558,13 +571,14 @@ Lengkapi setiap pertanyaan yang diberikan dan data akan otomatis tersimpan.
         
         await query.message.reply_text(next_step, parse_mode='Markdown', reply_markup=reply_markup)
     
+    @saves_session
     async def handle_layanan_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle Layanan selection dari inline keyboard"""
         query = update.callback_query
         await query.answer()
         
         user_id = query.from_user.id
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
         
         # Extract Category name from callback_data
         layanan_map = {
@@ -601,13 +615,14 @@ Lengkapi setiap pertanyaan yang diberikan dan data akan otomatis tersimpan.
         
         await query.message.reply_text(next_step, parse_mode='Markdown', reply_markup=reply_markup)
     
+    @saves_session
     async def handle_tarif_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle Tarif Layanan selection dari inline keyboard"""
         query = update.callback_query
         await query.answer()
         
         user_id = query.from_user.id
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
         
         # Extract Category name from callback_data
         tarif_map = {
@@ -720,13 +735,14 @@ Lengkapi setiap pertanyaan yang diberikan dan data akan otomatis tersimpan.
         
         await update.message.reply_text(next_step, parse_mode='Markdown', reply_markup=reply_markup)
     
+    @saves_session
     async def handle_paket_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle Dealing Paket selection dari inline keyboard"""
         query = update.callback_query
         await query.answer()
         
         user_id = query.from_user.id
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
         
         # Extract Category name from callback_data
         paket_map = {
@@ -765,13 +781,14 @@ Lengkapi setiap pertanyaan yang diberikan dan data akan otomatis tersimpan.
         
         await query.message.reply_text(next_step, parse_mode='Markdown', reply_markup=reply_markup)
     
+    @saves_session
     async def handle_bundle_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle Dealing Bundle selection dari inline keyboard"""
         query = update.callback_query
         await query.answer()
         
         user_id = query.from_user.id
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
         
         # Extract Category name from callback_data
         bundle_map = {
@@ -801,24 +818,23 @@ Lengkapi setiap pertanyaan yang diberikan dan data akan otomatis tersimpan.
         
         await query.message.reply_text(next_step, parse_mode='Markdown')
 
-    async def _handle_image(self, update, session, photo):
+    async def _handle_image(self, update, session, photo, context):
         photo_file = await photo.get_file()
         
         bio = BytesIO()
         await photo_file.download_to_memory(out=bio)
 
-        bio.seek(0)
-        encoded_image = base64.b64encode(bio.read()).decode('utf-8')
-
-        session.add_data('foto_evidence', encoded_image)
+        # Keep raw bytes; the summary re-sends the photo by its Telegram file_id
+        session.add_data('foto_evidence', bio.getvalue())
+        session.foto_file_id = photo.file_id
         session.set_state(ConversationState.COMPLETED)
         
         # TEMPORARY DELETE THIS, SEND CONFIRMATION AT THE SUMMARY INSTEAD
         # bio.seek(0)
         # await update.message.reply_photo(photo=bio, caption="**Foto Evidence**")
-        await self._process_final_data(update, session)
+        await self._process_final_data(update, session, context)
 
-    async def _process_final_data(self, query_or_update, session):
+    async def _process_final_data(self, query_or_update, session, context):
         """Process final data and save to Google Docs"""
         data = session.data
         
@@ -861,31 +877,65 @@ Lengkapi setiap pertanyaan yang diberikan dan data akan otomatis tersimpan.
 • **Deal Bundling:** {data.get('deal_bundling', '-')}
         """
         
-        image_bytes = base64.b64decode(data.pop('foto_evidence'))
-
-        image_file = BytesIO(image_bytes)
-        image_file.name = "confirm.jpg"
-        image_file.seek(0)
+        image_bytes = data.pop('foto_evidence')
 
-        await reply_photo(photo=image_file, caption=summary, parse_mode='Markdown')
+        await reply_photo(photo=session.foto_file_id or image_bytes, caption=summary, parse_mode='Markdown')
         
         # Third bubble - saving status
         saving_msg = "⏳ **Menyimpan ke Google Sheet...**"
         status_msg = await send_message(saving_msg, parse_mode='Markdown')
         
         try:
-            # Upload image to google drive
-            image_file_name = f'{data.get('kode_sa')}_{data.get('tanggal')}_{data.get('kegiatan')}.jpg'
+            # Persist locally first; the queue worker uploads to Drive and appends the row with retries
+            result = await self.submission_service.submit_async(data, image_bytes)
 
-            image_link = self.googleservices.upload_to_drive(image_file, image_file_name)
-            data['foto_evidence'] = image_link
+            if result.errors:
+                keyboard = [
+                    [InlineKeyboardButton("🔄 Coba Lagi", callback_data='start_input')],
+                    [InlineKeyboardButton("🏠 Menu Utama", callback_data='back_to_menu')]
+                ]
+                reply_markup = InlineKeyboardMarkup(keyboard)
+                errors_text = "\n• ".join([""] + list(result.errors))
+                await status_msg.edit_text(f"❌ **Validasi Gagal**\n{errors_text}", parse_mode='Markdown', reply_markup=reply_markup)
+                return
 
-            # Append link to submission data
-            data_to_submit = list(data.values())
-            logger.info(f"Data to submit: {data_to_submit}")
+            if result.duplicate:
+                await status_msg.edit_text(
+                    f"ℹ️ **Data ini sudah pernah dikirim**\n\n🧾 No. Antrian: {result.submission_id}", parse_mode='Markdown'
+                )
+            else:
+                await status_msg.edit_text(
+                    f"📥 **Data Diterima!**\n\n🆔 Kode SA: {data.get('kode_sa', '-')}\n🧾 No. Antrian: {result.submission_id}\n"
+                    "⏳ Sedang disimpan ke Google Sheet & Drive, pesan ini akan diperbarui setelah selesai.",
+                    parse_mode='Markdown'
+                )
+                context.application.create_task(self._report_saved(status_msg, data, result.completion, user_id))
 
-            success, message = self.googleservices.append_to_sheet([data_to_submit])
-                        
+            # The data is safe in the local queue, so the session can be reused right away
+            session.reset()
+            logger.info(f"Data queued as submission {result.submission_id} for user {user_id}")
+                
+        except Exception as e:
+            logger.error(f"Error saving data: {e}")
+            
+            keyboard = [
+                [InlineKeyboardButton("🔄 Coba Lagi", callback_data='start_input')],
+                [InlineKeyboardButton("🏠 Menu Utama", callback_data='back_to_menu')]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            await status_msg.edit_text(
+                "❌ **Terjadi kesalahan sistem**\n\n"
+                "Silakan pilih opsi di bawah:",
+                parse_mode='Markdown',
+                reply_markup=reply_markup
+            )
+
+    async def _report_saved(self, status_msg, data, completion, user_id):
+        """Update the acknowledgement message once the queue worker has finished a submission"""
+        submission, success = await completion
+
+        try:
             if success:
                 # Success with menu buttons
                 keyboard = [
@@ -907,9 +957,6 @@ Lengkapi setiap pertanyaan yang diberikan dan data akan otomatis tersimpan.
                 
                 await status_msg.edit_text(final_msg, parse_mode='Markdown', reply_markup=reply_markup)
                 
-                # Reset session
-                session.reset()
-                
                 logger.info(f"✅ Data saved successfully for user {user_id}")
                 
             else:
@@ -923,29 +970,17 @@ Lengkapi setiap pertanyaan yang diberikan dan data akan otomatis tersimpan.
                 error_msg = f"""
 ❌ **Gagal Menyimpan Data**
 
-Error: {message}
+Error: {submission.get('last_error') if submission else '-'}
 
 🔄 **Opsi:**
                 """
                 
                 await status_msg.edit_text(error_msg, parse_mode='Markdown', reply_markup=reply_markup)
-                
+
         except Exception as e:
-            logger.error(f"Error saving data: {e}")
-            
-            keyboard = [
-                [InlineKeyboardButton("🔄 Coba Lagi", callback_data='start_input')],
-                [InlineKeyboardButton("🏠 Menu Utama", callback_data='back_to_menu')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await status_msg.edit_text(
-                "❌ **Terjadi kesalahan sistem**\n\n"
-                "Silakan pilih opsi di bawah:",
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
+            logger.error(f"Could not update status message for user {user_id}: {e}")
     
+    @saves_session
     async def show_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show current conversation status - bisa dari command atau callback"""
         # Handle both regular message and callback query
@@ -956,7 +991,7 @@ Error: {message}
             user_id = update.effective_user.id
             send_message = update.message.reply_text
         
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
         
         # Add back to menu button
         keyboard = [
@@ -1053,6 +1088,7 @@ Error: {message}
         
         await send_message(status_msg, parse_mode='Markdown', reply_markup=reply_markup)
     
+    @saves_session
     async def cancel_conversation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Cancel current conversation - bisa dari command atau callback"""
         # Handle both regular message and callback query
@@ -1063,7 +1099,7 @@ Error: {message}
             user_id = update.effective_user.id
             send_message = update.message.reply_text
         
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
         
         keyboard = [
             [InlineKeyboardButton("🚀 Mulai Input Baru", callback_data='start_input')],
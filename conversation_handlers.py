@@ -5,8 +5,7 @@ from conversation_states import ConversationState
 from validators import DataValidator
 import logging
 from io import BytesIO
-import base64
-from googleservice import GoogleService
+from submission_service import get_submission_service
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +15,7 @@ class ConversationHandler:
     def __init__(self):
         self.session_manager = SessionManager()
         self.validator = DataValidator()
-        self.google_service = GoogleService()
+        self.submission_service = get_submission_service()
 
         # This is a bad practice, TODO: Figure out a way to do this better
         self.context = None
@@ -160,20 +159,24 @@ class ConversationHandler:
             query = update
             user_id = query.effective_user.id
         
-        session = self.session_manager.get_session(user_id)
+        session = await self.session_manager.get_session_async(user_id)
 
         # This is bad practice TODO: Figure out how to do this more efficiently
         self.context = context
 
-        if isinstance(query, CallbackQuery) and query.data == 'go_back':
-            await self._handle_go_back(query, session)
-            return
+        try:
+            if isinstance(query, CallbackQuery) and query.data == 'go_back':
+                await self._handle_go_back(query, session)
+                return
 
-        if session.state in self.handler_functions_map:
-            await self.handler_functions_map[session.state](query, session)
-        else:
-            if update.message:
-                await update.message.reply_text('State undefined or incorrect input type.')
+            if session.state in self.handler_functions_map:
+                await self.handler_functions_map[session.state](query, session)
+            else:
+                if update.message:
+                    await update.message.reply_text('State undefined or incorrect input type.')
+        finally:
+            # Persist whatever this update changed (coalesced, written off the event loop)
+            self.session_manager.save(user_id)
 
     async def handle_canceled(self, query, session, is_going_back=False):
         # TODO: HANDLE CANCELED HERE
@@ -191,9 +194,6 @@ class ConversationHandler:
         # Reset any existing session
         self.session_manager.reset_session(user_id)
         self.history = []
-
-        self.google_service.authenticate()
-        self.google_service.build_services()
         
         logger.info(f"Started conversation for user {user_id} ({user_name})")
         await self._ask_kode_sa(query, session)
@@ -885,10 +885,9 @@ class ConversationHandler:
         bio = BytesIO()
         await photo_file.download_to_memory(out=bio)
 
-        bio.seek(0)
-        encoded_image = base64.b64encode(bio.read()).decode('utf-8')
-
-        session.add_data('foto_evidence', encoded_image)
+        # Keep raw bytes; the summary re-sends the photo by its Telegram file_id
+        session.add_data('foto_evidence', bio.getvalue())
+        session.foto_file_id = photo.file_id
         await query.message.reply_text("Gambar tersimpan.")
 
         session.history.append(session.state)
@@ -934,19 +933,13 @@ class ConversationHandler:
 • **Nomor HP PIC:** {data.get('telepon_pic', '-')}
 """
         
-        image_bytes = base64.b64decode(data.get('foto_evidence'))
-
-        image_file = BytesIO(image_bytes)
-        image_file.name = "confirm.jpg"
-        image_file.seek(0)
-        
         keyboard = [
             [InlineKeyboardButton("✅ Konfirmasi dan Submit", callback_data='confirm_and_submit')],
             [InlineKeyboardButton("❌ Batal", callback_data='batal_submit')],
         ]
         reply_markup = self._create_back_keyboard(keyboard)
         
-        await query.message.reply_photo(photo=image_file, caption=summary, parse_mode='Markdown', reply_markup=reply_markup)
+        await query.message.reply_photo(photo=session.foto_file_id or data.get('foto_evidence'), caption=summary, parse_mode='Markdown', reply_markup=reply_markup)
 
     async def process_all_data(self, query, session):
         await self._expire_previous_buttons(query, self.context, session)
@@ -972,57 +965,64 @@ class ConversationHandler:
         data = session.data
 
         try:
-            image_bytes = base64.b64decode(data.pop('foto_evidence'))
+            image_bytes = data.pop('foto_evidence')
+            kegiatan = data.get('kegiatan')
+            activity_text = "Visit" if kegiatan == 'Visit' else "Dealing"
 
-            image_file = BytesIO(image_bytes)
-            image_file.seek(0)
+            # Persist locally first; the queue worker uploads and appends with retries
+            result = await self.submission_service.submit_async(data, image_bytes)
 
-            image_file_name = f"{data.get('kode_sa')}_{data.get('tanggal')}_{data.get('kegiatan')}.jpg"
+            if result.errors:
+                keyboard = [
+                    [InlineKeyboardButton("🔄 Coba Lagi", callback_data='start_input')],
+                ]
+                errors_text = "\n• ".join([""] + list(result.errors))
+                await status_msg.edit_text(
+                    f"❌ **Validasi Gagal**\n{errors_text}",
+                    parse_mode='Markdown',
+                    reply_markup=InlineKeyboardMarkup(keyboard)
+                )
+                return
 
-            image_link = self.google_service.upload_to_drive(image_file, image_file_name)
-            data['foto_evidence'] = image_link
+            if result.duplicate:
+                final_msg = f"ℹ️ **Data ini sudah pernah dikirim**\n\n🧾 No. Antrian: {result.submission_id}"
+            else:
+                final_msg = f"📥 **Data {activity_text} Diterima!**\n\n🆔 Kode SA: {data.get('kode_sa', '-')}\n🧾 No. Antrian: {result.submission_id}\n⏳ Sedang disimpan ke Google Sheet & Drive, pesan ini akan diperbarui setelah selesai."
 
-            kegiatan = data.get('kegiatan')
+            # The data is safe in the local queue, so the session can be reused right away
+            session.reset()
+            session.history = []
+
+            try:
+                await status_msg.edit_text(final_msg, parse_mode='Markdown')
+            finally:
+                if result.completion is not None:
+                    self.context.application.create_task(
+                        self._report_saved(status_msg, data, activity_text, result.completion, user_id)
+                    )
+
+            logger.info(f"Data queued as submission {result.submission_id} for user {user_id}")
+
+        except Exception as e:
+            logger.error(f"Error saving data: {e}")
             
-            # Prepare ordered data based on activity type
-            if kegiatan == 'Visit':
-                # For Visit: Set default values for dealing fields
-                if 'paket_deal' not in data:
-                    data['paket_deal'] = '-'
-                if 'deal_bundling' not in data:
-                    data['deal_bundling'] = '-'
-            else:  # Dealing
-                # For Dealing: Set default values for visit fields
-                if 'layanan' not in data:
-                    data['layanan'] = '-'
-                if 'tarif' not in data:
-                    data['tarif'] = '-'
-
-            # Standard order for all data: 17 fields total
-            ordered_data = [
-                data.get('kode_sa', '-'),      # 1
-                data.get('nama', '-'),         # 2
-                data.get('no_telp', '-'),      # 3
-                data.get('witel', '-'),        # 4
-                data.get('telda', '-'),        # 5
-                data.get('tanggal', '-'),      # 6
-                data.get('kategori', '-'),     # 7
-                data.get('tenant', '-'),       # 8
-                data.get('kegiatan', '-'),     # 9
-                data.get('layanan', '-'),      # 10 (Visit only, '-' for Dealing)
-                data.get('tarif', '-'),        # 11 (Visit only, '-' for Dealing)
-                data.get('nama_pic', '-'),     # 12
-                data.get('jabatan_pic', '-'),  # 13
-                data.get('telepon_pic', '-'),  # 14
-                data.get('paket_deal', '-'),   # 15 (Dealing only, '-' for Visit)
-                data.get('deal_bundling', '-'), # 16 (Dealing only, '-' for Visit)
-                data.get('foto_evidence', '-'), # 17
+            keyboard = [
+                [InlineKeyboardButton("🔄 Coba Lagi", callback_data='start_input')],
             ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            await status_msg.edit_text(
+                "❌ **Terjadi kesalahan sistem**\n\n"
+                "Silakan pilih opsi di bawah:",
+                parse_mode='Markdown',
+                reply_markup=reply_markup
+            )
 
-            logger.info(f"Data to submit: {ordered_data}")
+    async def _report_saved(self, status_msg, data, activity_text, completion, user_id):
+        """Update the acknowledgement message once the queue worker has finished a submission"""
+        submission, success = await completion
 
-            success, message = self.google_service.append_to_sheet([ordered_data])
-                        
+        try:
             if success:
                 # Success with menu buttons
                 keyboard = [
@@ -1030,15 +1030,9 @@ class ConversationHandler:
                 ]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 
-                activity_text = "Visit" if kegiatan == 'Visit' else "Dealing"
-                field_count = "15" if kegiatan == 'Visit' else "15"  # Both are 15 steps now
-                
-                final_msg = f"🎉 **Data {activity_text} Berhasil Disimpan!**\n\n🆔 Kode SA: {data.get('kode_sa', '-')}\n✅ Data lengkap ({field_count} field) telah tersimpan ke Google Docs\n🕐 Waktu: Otomatis tercatat\n---\n💡 **Pilih aksi selanjutnya:**"
+                final_msg = f"🎉 **Data {activity_text} Berhasil Disimpan!**\n\n🆔 Kode SA: {data.get('kode_sa', '-')}\n✅ Data lengkap (15 field) telah tersimpan ke Google Docs\n🕐 Waktu: Otomatis tercatat\n---\n💡 **Pilih aksi selanjutnya:**"
                 
                 await status_msg.edit_text(final_msg, parse_mode='Markdown', reply_markup=reply_markup)
-                
-                session.reset()
-                session.history = []
 
                 logger.info(f"✅ Data saved successfully for user {user_id}")
                 
@@ -1049,21 +1043,9 @@ class ConversationHandler:
                 ]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 
-                error_msg = f"❌ **Gagal Menyimpan Data**\n\nError: {message}\n\n🔄 **Opsi:**"
+                error_msg = f"❌ **Gagal Menyimpan Data**\n\nError: {submission.get('last_error') if submission else '-'}\n\n🔄 **Opsi:**"
                 
                 await status_msg.edit_text(error_msg, parse_mode='Markdown', reply_markup=reply_markup)
-                
+
         except Exception as e:
-            logger.error(f"Error saving data: {e}")
-            
-            keyboard = [
-                [InlineKeyboardButton("🔄 Coba Lagi", callback_data='start_input')],
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await status_msg.edit_text(
-                "❌ **Terjadi kesalahan sistem**\n\n"
-                "Silakan pilih opsi di bawah:",
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
+            logger.error(f"Could not update status message for user {user_id}: {e}")
@@ -1,4 +1,5 @@
 from enum import Enum
+from visit_record import VisitRecord
 
 class ConversationState(Enum):
     """States untuk conversation flow"""
@@ -24,36 +25,39 @@ class ConversationState(Enum):
 
 class UserSession:
     """Class untuk menyimpan session data per user"""
-    def __init__(self, user_id):
+    __slots__ = ('user_id', '_state', 'data', 'history', 'last_message_id', 'foto_file_id', 'last_active',
+                 'on_state_change', 'on_data_change')
+
+    def __init__(self, user_id, on_state_change=None, on_data_change=None):
         self.user_id = user_id
-        self.state = ConversationState.IDLE
-        self.data = {}
+        self._state = ConversationState.IDLE
         self.history = []
         self.last_message_id = None
+        self.last_active = 0.0  # monotonic time of the last access, kept by SessionManager
+        # Called as on_state_change(session, was_active, is_active) when leaving or entering IDLE
+        self.on_state_change = on_state_change
+        # Called as on_data_change(session) after add_data, so the owner can re-check its size
+        self.on_data_change = on_data_change
         self.reset()
 
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, new_state):
+        was_active = self._state != ConversationState.IDLE
+        self._state = new_state
+        is_active = new_state != ConversationState.IDLE
+        if was_active != is_active and self.on_state_change is not None:
+            self.on_state_change(self, was_active, is_active)
+
     def reset(self):
         """Reset session data"""
         self.state = ConversationState.IDLE
-        self.data = {
-            'kode_sa': None,
-            'nama': None,
-            'no_telp': None,
-            'witel': None,
-            'telda': None,
-            'tanggal': None,
-            'kategori': None,
-            'kegiatan': None,
-            'tenant': None,
-            'layanan': None,
-            'tarif': None,
-            'nama_pic': None,
-            'jabatan_pic': None,
-            'telepon_pic': None,
-            'paket_deal': None,
-            'deal_bundling': None,
-            'foto_evidence': None,
-        }
+        self.foto_file_id = None  # Telegram file_id of the evidence photo, raw bytes live in data
+        # A fresh record rather than clearing in place: a queued submission may still hold the old one
+        self.data = VisitRecord()
     
     def set_state(self, new_state):
         """Update conversation state"""
@@ -62,31 +66,13 @@ class UserSession:
     def add_data(self, key, value):
         """Add data to session"""
         self.data[key] = value
+        if self.on_data_change is not None:
+            self.on_data_change(self)
     
     def is_complete(self):
         """Check if all required data collected"""
-        return all(self.data.values())
+        return self.data.is_complete()
     
     def get_progress(self):
         """Get current progress"""
-        steps = [
-            'kode_sa',
-            'nama',
-            'no_telp',
-            'witel',
-            'telda',
-            'tanggal',
-            'kategori',
-            'kegiatan',
-            'tenant',
-            'layanan',
-            'tarif',
-            'nama_pic',
-            'jabatan_pic',
-            'telepon_pic',
-            'paket_deal',
-            'deal_bundling',
-            'foto_evidence',
-        ]
-        completed = sum(1 for step in steps if self.data[step])
-        return completed, len(steps)
+        return self.data.filled_count(), len(VisitRecord.FIELDS)
@@ -1,21 +1,151 @@
+import os
+import re
+import json
+import time
 import config
 import logging
+import threading
+import validators
 
 from googleapiclient.http import MediaIoBaseUpload
+from googleapiclient.errors import HttpError
 
 logger = logging.getLogger(__name__)
 
-def upload(service, image, image_name):
+# File ids reserved with files().generateIds, handed out one per upload
+_file_id_pool = []
+_file_id_lock = threading.Lock()
+
+def allocate_file_id(service):
+    """Reserve a Drive file id up front so the file's link is known before the upload finishes"""
+    with _file_id_lock:
+        if not _file_id_pool:
+            result = service.files().generateIds(count=config.DRIVE_ID_BATCH, space='drive').execute()
+            _file_id_pool.extend(result.get('ids', []))
+            logger.info(f"reserved {len(_file_id_pool)} Drive file ids")
+        return _file_id_pool.pop()
+
+# ========== FOLDER PARTITIONING ==========
+# Photos go to DRIVE_FOLDER_ID / <Witel> / <YYYY-MM> so no folder grows to tens of thousands of files
+
+FOLDER_MIMETYPE = 'application/vnd.google-apps.folder'
+# Photos whose witel is missing or not one of validators.WITEL_OPTIONS; free text never creates a folder
+NO_WITEL_FOLDER = 'Tanpa Witel'
+
+# DD-MM-YYYY (validated forms) or YYYY-MM-DD (HTML date inputs)
+_DMY_PATTERN = re.compile(r'^\s*\d{1,2}[-/ ](\d{1,2})[-/ ](\d{4})\s*$')
+_YMD_PATTERN = re.compile(r'^\s*(\d{4})-(\d{1,2})-\d{1,2}\s*$')
+
+# "<parent id>/<name>" -> folder id; loaded from DRIVE_FOLDER_CACHE_PATH on first use
+_folder_cache = None
+_folder_lock = threading.Lock()
+
+def _load_folder_cache():
+    global _folder_cache
+    try:
+        with open(config.DRIVE_FOLDER_CACHE_PATH, encoding='utf-8') as f:
+            _folder_cache = json.load(f)
+    except FileNotFoundError:
+        _folder_cache = {}
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable Drive folder cache: {e}")
+        _folder_cache = {}
+
+def _save_folder_cache():
+    cache_dir = os.path.dirname(config.DRIVE_FOLDER_CACHE_PATH)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{config.DRIVE_FOLDER_CACHE_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(_folder_cache, f)
+    os.replace(tmp_path, config.DRIVE_FOLDER_CACHE_PATH)
+
+def month_folder_name(tanggal):
+    """'YYYY-MM' of a visit date; the current month when the date can't be read"""
+    match = _DMY_PATTERN.match(tanggal or '')
+    if match:
+        return f"{match.group(2)}-{int(match.group(1)):02d}"
+    match = _YMD_PATTERN.match(tanggal or '')
+    if match:
+        return f"{match.group(1)}-{int(match.group(2)):02d}"
+    return time.strftime('%Y-%m')
+
+def _child_folder(service, parent_id, name):
+    """Folder id of parent/name, found or created on a cache miss; caller holds _folder_lock"""
+    key = f"{parent_id}/{name}"
+    folder_id = _folder_cache.get(key)
+    if folder_id:
+        return folder_id
+
+    escaped_name = name.replace('\\', '\\\\').replace("'", "\\'")
+    result = service.files().list(
+        q=f"name = '{escaped_name}' and '{parent_id}' in parents and mimeType = '{FOLDER_MIMETYPE}' and trashed = false",
+        fields='files(id)', pageSize=1, spaces='drive'
+    ).execute()
+    existing = result.get('files', [])
+    if existing:
+        folder_id = existing[0]['id']
+    else:
+        folder_id = service.files().create(
+            body={'name': name, 'mimeType': FOLDER_MIMETYPE, 'parents': [parent_id]}, fields='id'
+        ).execute()['id']
+        logger.info(f"created Drive folder {name} ({folder_id})")
+
+    _folder_cache[key] = folder_id
+    _save_folder_cache()
+    return folder_id
+
+def partition_folder(service, witel, tanggal):
+    """Folder id for a photo: DRIVE_FOLDER_ID / <Witel> / <YYYY-MM>, created on first use.
+
+    Lookups are served from memory (backed by a JSON file), so Drive is only asked once per folder.
+    """
+    if not config.DRIVE_PARTITION_FOLDERS:
+        return config.DRIVE_FOLDER_ID
+
+    witel_name = str(witel or '').strip()
+    if witel_name not in validators.WITEL_SET:
+        witel_name = NO_WITEL_FOLDER
+    month_name = month_folder_name(tanggal)
+
+    if _folder_cache is not None:
+        witel_id = _folder_cache.get(f"{config.DRIVE_FOLDER_ID}/{witel_name}")
+        folder_id = witel_id and _folder_cache.get(f"{witel_id}/{month_name}")
+        if folder_id:
+            return folder_id
+
+    # Misses are serialized so concurrent uploads don't create the same folder twice
+    with _folder_lock:
+        if _folder_cache is None:
+            _load_folder_cache()
+        witel_id = _child_folder(service, config.DRIVE_FOLDER_ID, witel_name)
+        return _child_folder(service, witel_id, month_name)
+
+def view_link(file_id):
+    """Same link Drive returns as webViewLink for an uploaded file"""
+    return f"https://drive.google.com/file/d/{file_id}/view?usp=drivesdk"
+
+def upload(service, image, image_name, mimetype='image/jpeg', file_id=None, folder_id=None):
     try:
         file_metadata = {
             'name': image_name,
-            'parents': [config.DRIVE_FOLDER_ID]
+            'parents': [folder_id or config.DRIVE_FOLDER_ID]
         }
+        if file_id:
+            file_metadata['id'] = file_id
 
-        media = MediaIoBaseUpload(image, mimetype='image/jpeg', resumable=True)
+        media = MediaIoBaseUpload(image, mimetype=mimetype, chunksize=config.DRIVE_UPLOAD_CHUNK_BYTES, resumable=True)
         
         logger.info(f"uploading {image_name} to Google Drive folder...")
-        file = service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink').execute()
+        request = service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink')
+
+        # One resumable session; a failed chunk is retried from the last byte Drive acknowledged.
+        # Retries are left to the rate limiter (num_retries=0), so they aren't multiplied by googleapiclient's own
+        file = None
+        while file is None:
+            progress, file = request.next_chunk(num_retries=0)
+            if progress:
+                logger.debug(f"{image_name}: {int(progress.progress() * 100)}% uploaded")
 
         file_id = file.get('id')
         file_link = file.get('webViewLink')
@@ -26,5 +156,12 @@ def upload(service, image, image_name):
         
         return file_link
 
+    except HttpError as e:
+        # Retrying with a reserved id whose upload already went through
+        if file_id and e.resp.status == 409:
+            logger.info(f"file {file_id} already uploaded")
+            return view_link(file_id)
+        logger.error(f"An error occurred: {e}")
+
     except Exception as e:
         logger.error(f"An error occurred: {e}")
@@ -0,0 +1,185 @@
+import datetime
+from collections import namedtuple
+from validators import DataValidator
+
+try:
+    import pandas
+except ImportError:  # Optional; validate_many also accepts a DataFrame when pandas is installed
+    pandas = None
+
+# kind: 'text' runs rule (a DataValidator method) and keeps its cleaned value,
+#       'select' runs rule (which checks the validators.*_OPTIONS list) and keeps the canonical option;
+#       an empty select reports message, any other value the rule's own error (which lists the options),
+#       'photo' is checked by the entry point that receives the upload.
+# kegiatan: the field only applies to this activity type (None = always).
+Field = namedtuple('Field', ['name', 'header', 'kind', 'rule', 'message', 'kegiatan'], defaults=(None, None, None))
+
+# One entry per sheet column, in sheet order. HEADER_DATA, the row layout and form validation all come from here.
+FORM_FIELDS = (
+    Field('kode_sa', "Kode SA", 'text', DataValidator.validate_kode_sa, "Kode SA tidak valid"),
+    Field('nama', "Nama Lengkap", 'text', DataValidator.validate_nama, "Nama tidak valid"),
+    Field('no_telp', "Nomor HP SA", 'text', DataValidator.validate_telepon, "No. Telepon tidak valid"),
+    Field('witel', "Witel", 'select', DataValidator.validate_witel, "Witel harus dipilih"),
+    Field('telda', "Telkom Daerah", 'text', DataValidator.validate_telda, "Telkom Daerah tidak valid"),
+    Field('tanggal', "Tanggal Visit", 'text', DataValidator.validate_tanggal, "Tanggal tidak valid"),
+    Field('kategori', "Kategori Pelanggan", 'select', DataValidator.validate_kategori, "Kategori pelanggan harus dipilih"),
+    Field('tenant', "Nama Tenant / Desa / Puskesmas / Kecamatan yang divisit", 'text', DataValidator.validate_tenant, "Nama tenant tidak valid"),
+    Field('kegiatan', "Kegiatan", 'select', DataValidator.validate_kegiatan, "Kegiatan harus dipilih"),
+    Field('layanan', "Layanan Saat Ini", 'select', DataValidator.validate_layanan, "Layanan harus dipilih untuk Visit", 'Visit'),
+    Field('tarif', "Tarif Layanan Saat Ini", 'select', DataValidator.validate_tarif, "Tarif harus dipilih untuk Visit", 'Visit'),
+    Field('nama_pic', "Nama PIC Pelanggan", 'text', DataValidator.validate_nama_pic, "Nama PIC tidak valid"),
+    Field('jabatan_pic', "Jabatan PIC", 'text', DataValidator.validate_jabatan_pic, "Jabatan PIC tidak valid"),
+    Field('telepon_pic', "Nomor HP PIC Pelanggan", 'text', DataValidator.validate_telepon_pic, "Telepon PIC tidak valid"),
+    Field('paket_deal', "Deal Paket Berapa Mbps", 'select', DataValidator.validate_paket, "Paket deal harus dipilih untuk Dealing", 'Dealing'),
+    Field('deal_bundling', "Dealing Layanan Bundling", 'select', DataValidator.validate_bundling, "Deal bundling harus dipilih untuk Dealing",
+          'Dealing'),
+    Field('foto_evidence', "Foto Evidence Visit", 'photo'),
+)
+
+FIELD_NAMES = tuple(field.name for field in FORM_FIELDS)
+HEADER = [field.header for field in FORM_FIELDS]
+
+NOT_APPLICABLE = '-'
+
+# Validation plan, compiled once: (name, rule, message, kegiatan, is_select) for every non-photo field.
+# kegiatan comes before the fields that depend on it, so they are checked against its normalised value.
+_PLAN = tuple(
+    (field.name, field.rule, field.message, field.kegiatan, field.kind == 'select')
+    for field in FORM_FIELDS if field.kind != 'photo'
+)
+
+def _error(message, is_select, value, reason):
+    """A filled-in select that is not one of its options reports the rule's reason (it lists the options)"""
+    return reason if is_select and value else message
+
+def validate_form(data):
+    """Validate a whole visit/dealing form in one pass.
+
+    Returns (errors, values): error messages in sheet order, and the cleaned value of every
+    non-photo field (fields for the other activity type are '-').
+    """
+    errors = []
+    values = {}
+
+    for name, rule, message, only_for, is_select in _PLAN:
+        # An invalid kegiatan is already an error; its conditional fields are then skipped
+        if only_for is not None and values.get('kegiatan') != only_for:
+            values[name] = data.get(name) or NOT_APPLICABLE
+            continue
+
+        value = data.get(name)
+        is_valid, result = rule(value or '')
+        if is_valid:
+            values[name] = result
+        else:
+            errors.append(_error(message, is_select, value, result))
+
+    return errors, values
+
+def cell_text(value):
+    """Text of a spreadsheet or DataFrame cell as the rules expect it.
+
+    Excel and pandas hand back dates as datetime/Timestamp and numbers as floats: dates become
+    DD-MM-YYYY and whole numbers lose the '.0' (81234567890.0 -> '81234567890').
+    """
+    if value is None:
+        return ''
+    if isinstance(value, datetime.date):  # also datetime and pandas.Timestamp
+        return value.strftime('%d-%m-%Y')
+    if isinstance(value, float) and value.is_integer():  # also numpy.float64
+        return str(int(value))
+    return str(value)
+
+def _columns(records):
+    """Return (row count, column getter) for a list of mappings or a pandas DataFrame"""
+    if pandas is not None and isinstance(records, pandas.DataFrame):
+        frame = records.astype(object).where(records.notna(), None)
+        return len(frame), lambda name: frame[name].tolist() if name in frame.columns else [None] * len(frame)
+
+    records = records if isinstance(records, list) else list(records)
+    return len(records), lambda name: [record.get(name) for record in records]
+
+def validate_many(records):
+    """Validate many forms column by column; same rules and messages as validate_form.
+
+    Each rule runs once per distinct value in a column (sheets repeat witel, dates, names and
+    options a lot), so thousands of rows cost about as much as their unique values.
+    Returns (report, values): {row index: [errors]} for invalid rows only, and a list with the
+    cleaned values of every row.
+    """
+    row_count, column = _columns(records)
+    errors = [[] for _ in range(row_count)]
+    values = [{} for _ in range(row_count)]
+
+    for name, rule, message, only_for, is_select in _PLAN:
+        cells = column(name)
+
+        if only_for is not None:
+            # kegiatan was validated earlier in the plan; compare against its normalised value
+            applies = [row_values.get('kegiatan') == only_for for row_values in values]
+        else:
+            applies = None
+
+        # Each distinct value is checked once for the whole column
+        results = {}
+        for index, value in enumerate(cells):
+            if applies is not None and not applies[index]:
+                values[index][name] = value or NOT_APPLICABLE
+                continue
+            # Spreadsheet cells may hold numbers (phone numbers, dates); rules expect text
+            value = cell_text(value)
+            result = results.get(value)
+            if result is None:
+                result = results[value] = rule(value)
+            if result[0]:
+                values[index][name] = result[1]
+            else:
+                errors[index].append(_error(message, is_select, value, result[1]))
+
+    report = {index: row_errors for index, row_errors in enumerate(errors) if row_errors}
+    return report, values
+
+# Self check jika file dijalankan langsung
+if __name__ == "__main__":
+    sample = {
+        'kode_sa': 'sa001', 'nama': 'budi santoso', 'no_telp': '81234567890', 'witel': 'Bali',
+        'telda': 'denpasar', 'tanggal': '15/08/2025', 'kategori': 'Desa', 'tenant': 'desa sukamaju',
+        'kegiatan': 'Visit', 'layanan': 'Indihome', 'tarif': '< Rp 200.000', 'nama_pic': 'siti',
+        'jabatan_pic': 'kepala desa', 'telepon_pic': '+6281234567890',
+    }
+    errors, values = validate_form(sample)
+    print(f"{'✅' if not errors else '❌'} valid visit form: {values}")
+
+    errors, _ = validate_form(dict(sample, kegiatan='Dealing', nama='x'))
+    print(f"{'✅' if errors == ['Nama tidak valid', 'Paket deal harus dipilih untuk Dealing', 'Deal bundling harus dipilih untuk Dealing'] else '❌'} dealing form errors: {errors}")
+
+    errors, _ = validate_form(dict(sample, witel='Mars', kategori='Toko', kegiatan='Foo'))
+    print(f"{'✅' if len(errors) == 3 else '❌'} unknown options rejected: {errors}")
+
+    errors, values = validate_form(dict(sample, kegiatan=' visit '))
+    print(f"{'✅' if not errors and values['kegiatan'] == 'Visit' else '❌'} kegiatan normalised before its fields: {errors}")
+
+    # Cells as openpyxl (data_only) returns them from an Excel export: a datetime and float phone numbers
+    excel_row = dict(sample, tanggal=datetime.datetime(2025, 8, 15), no_telp=81234567890.0, telepon_pic=6281234567890.0)
+    report, values = validate_many([{name: cell_text(value) for name, value in excel_row.items()}])
+    ok = not report and values[0]['tanggal'] == '15-08-2025' and values[0]['no_telp'] == '081234567890' \
+        and values[0]['telepon_pic'] == '6281234567890'
+    print(f"{'✅' if ok else '❌'} Excel date and phone cells: {report or values[0]}")
+
+    import random, time
+    names = ['budi santoso', 'siti aminah', 'x', 'agus', 'dewi lestari']
+    records = [
+        dict(sample, nama=random.choice(names), tanggal=f"{random.randint(1, 31)}/08/2025", kegiatan=random.choice(['Visit', 'Dealing']))
+        for _ in range(10000)
+    ]
+    started = time.perf_counter()
+    expected = [validate_form(record) for record in records]
+    per_row = time.perf_counter() - started
+
+    started = time.perf_counter()
+    report, values = validate_many(records)
+    batched = time.perf_counter() - started
+
+    same = all(report.get(i, []) == expected[i][0] and values[i] == expected[i][1] for i in range(len(records)))
+    print(f"{'✅' if same else '❌'} validate_many matches validate_form on {len(records)} rows ({len(report)} invalid)")
+    print(f"⏱️ per-row: {per_row * 1000:.0f} ms, column-wise: {batched * 1000:.0f} ms")
@@ -3,16 +3,25 @@ import json
 import logging
 import config
 import time
+import threading
+from datetime import datetime, timedelta
 
 import drive
 import spreadsheet
+from sheet_batcher import SheetBatcher
 
+import httplib2
+import google_auth_httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
+from rate_limit import RateLimitedRequest
 
 logger = logging.getLogger(__name__)
 
+# Refresh the access token this long before it actually expires
+TOKEN_REFRESH_MARGIN = timedelta(seconds=300)
+
 class GoogleService:
     def __init__(self):
         self.sheet_service = None
@@ -20,62 +29,122 @@ class GoogleService:
         self.creds = None
         self.scopes = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive.file']
 
-    def authenticate(self):
-        try:
-            if not os.path.exists(config.OAUTH_FILE):
-                logger.error("Auth not initialized. Expected 'google_oauth.json' to exist with client_id, client_secret, refresh_token. Please run the 'auth_bootstrap_desktop.py' script to generate the auth credentials.")
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._oauth_blob = None
+        self.sheet_batcher = SheetBatcher(self._get_sheet_service)
 
-                raise RuntimeError(
-                    "Auth not initialized. Expected 'google_oauth.json' to exist with client_id, client_secret, refresh_token."
+    def authenticate(self):
+        """Load credentials once; later calls only refresh when the token is near expiry"""
+        with self._lock:
+            if self.creds is not None:
+                self._refresh_if_needed()
+                return
+
+            try:
+                if not os.path.exists(config.OAUTH_FILE):
+                    logger.error("Auth not initialized. Expected 'google_oauth.json' to exist with client_id, client_secret, refresh_token. Please run the 'auth_bootstrap_desktop.py' script to generate the auth credentials.")
+
+                    raise RuntimeError(
+                        "Auth not initialized. Expected 'google_oauth.json' to exist with client_id, client_secret, refresh_token."
+                    )
+
+                with open(config.OAUTH_FILE, 'r') as token:
+                    blob = json.load(token)
+
+                # get creds process
+                missing = [k for k in ("client_id", "client_secret", "refresh_token") if not blob.get(k)]
+                if missing:
+                    logger.error(f"Missing fields in {config.OAUTH_FILE}: {missing}")
+                    raise RuntimeError(f"Missing fields in {config.OAUTH_FILE}: {missing}")
+
+                creds = Credentials(
+                    token=blob.get("access_token"),  # may be None
+                    refresh_token=blob["refresh_token"],
+                    token_uri="https://oauth2.googleapis.com/token",
+                    client_id=blob["client_id"],
+                    client_secret=blob["client_secret"],
+                    scopes=self.scopes,
                 )
 
-            with open(config.OAUTH_FILE, 'r') as token:
-                blob = json.load(token)
-
-            # get creds process
-            missing = [k for k in ("client_id", "client_secret", "refresh_token") if not blob.get(k)]
-            if missing:
-                logger.error(f"Missing fields in {config.OAUTH_FILE}: {missing}")
-                raise RuntimeError(f"Missing fields in {config.OAUTH_FILE}: {missing}")
-
-            creds = Credentials(
-                token=blob.get("access_token"),  # may be None
-                refresh_token=blob["refresh_token"],
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=blob["client_id"],
-                client_secret=blob["client_secret"],
-                scopes=self.scopes,
-            )
-
-            if not creds.valid:
-                req = Request()
-                creds.refresh(req)
-                blob["access_token"] = creds.token
-                blob["scopes"] = self.scopes
-                blob["saved_at"] = int(time.time())
-
-                os.makedirs(os.path.dirname(config.OAUTH_FILE), exist_ok=True)
-                with open(config.OAUTH_FILE, "w") as f:
-                    json.dump(blob, f, indent=2)
-                os.chmod(config.OAUTH_FILE, 0o600)
-
-            logger.info('Google Service authentication successful')
-            self.creds = creds
-
-        except Exception as e:
-            logger.error(f"An Error occurred: {e}")
+                self._oauth_blob = blob
+                self.creds = creds
+                self._refresh_if_needed()
+
+                logger.info('Google Service authentication successful')
+
+            except Exception as e:
+                self.creds = None
+                logger.error(f"An Error occurred: {e}")
+
+    def _refresh_if_needed(self):
+        """Refresh the access token only when it is missing or about to expire"""
+        creds = self.creds
+        expiring = creds.expiry is not None and creds.expiry - TOKEN_REFRESH_MARGIN <= datetime.utcnow()
+        if creds.token and not expiring:
+            return
+
+        creds.refresh(Request())
+        logger.info("Google access token refreshed")
+
+        blob = self._oauth_blob
+        blob["access_token"] = creds.token
+        blob["scopes"] = self.scopes
+        blob["saved_at"] = int(time.time())
+
+        oauth_dir = os.path.dirname(config.OAUTH_FILE)
+        if oauth_dir:
+            os.makedirs(oauth_dir, exist_ok=True)
+        with open(config.OAUTH_FILE, "w") as f:
+            json.dump(blob, f, indent=2)
+        os.chmod(config.OAUTH_FILE, 0o600)
+
+    def _build_request(self, http, *args, **kwargs):
+        """Give every thread its own authorized connection; httplib2 is not thread-safe.
+
+        Requests are rate limited per API and retry 429/5xx responses, see rate_limit.
+        """
+        thread_http = getattr(self._local, 'http', None)
+        if thread_http is None:
+            thread_http = google_auth_httplib2.AuthorizedHttp(self.creds, http=httplib2.Http())
+            self._local.http = thread_http
+        return RateLimitedRequest(thread_http, *args, **kwargs)
 
     def build_services(self):
-        try:
-            self.sheet_service = build('sheets', 'v4', credentials=self.creds)
-            self.drive_service = build('drive', 'v3', credentials=self.creds)
-            logger.info("Connected to Sheet and Drive services")    
-
-        except Exception as e:
-            logger.error(f"An Error occurred: {e}")
+        """Build the Sheets and Drive clients once per process"""
+        with self._lock:
+            if self.sheet_service is not None and self.drive_service is not None:
+                return
+
+            try:
+                self.sheet_service = build('sheets', 'v4', credentials=self.creds, requestBuilder=self._build_request, cache_discovery=False)
+                self.drive_service = build('drive', 'v3', credentials=self.creds, requestBuilder=self._build_request, cache_discovery=False)
+                logger.info("Connected to Sheet and Drive services")
+
+            except Exception as e:
+                self.sheet_service = None
+                self.drive_service = None
+                logger.error(f"An Error occurred: {e}")
+
+    def ensure_ready(self):
+        """Lazily authenticate and build clients; cheap after the first call"""
+        self.authenticate()
+        self.build_services()
+
+    def _get_sheet_service(self):
+        self.ensure_ready()
+        return self.sheet_service
+
+    def queue_sheet_append(self, new_data: list):
+        """Hand rows to the batcher; returns a Future resolving to (status, range or error message)"""
+        return self.sheet_batcher.submit(new_data)
+
+    def append_rows(self, rows: list):
+        """Append rows in one values().append call, bypassing the batcher; returns the A1 range written"""
+        return spreadsheet.append_rows(self._get_sheet_service(), rows)
 
     def append_to_sheet(self, new_data: list):
-        status, msg = spreadsheet.append_data(self.sheet_service, new_data)
+        status, msg = self.queue_sheet_append(new_data).result()
         if status:
             logger.info(f"append to sheet success: {msg}")
         else:
@@ -83,9 +152,41 @@ class GoogleService:
 
         return status, msg
 
-    def upload_to_drive(self, image, image_name):
+    def upload_to_drive(self, image, image_name, mimetype='image/jpeg', file_id=None, folder_id=None):
+        self.ensure_ready()
+        try:
+            return drive.upload(self.drive_service, image, image_name, mimetype, file_id, folder_id)
+
+        except Exception as e:
+            logger.error(f"An Error occurred: {e}")
+
+    def drive_folder(self, witel, tanggal):
+        """Witel/month folder for a photo, or None (upload to DRIVE_FOLDER_ID) if it can't be resolved"""
+        self.ensure_ready()
+        try:
+            return drive.partition_folder(self.drive_service, witel, tanggal)
+
+        except Exception as e:
+            logger.error(f"An Error occurred: {e}")
+
+    def allocate_drive_file_id(self):
+        """Reserved Drive file id, or None if reservation failed (callers fall back to upload-then-append)"""
+        self.ensure_ready()
         try:
-            return drive.upload(self.drive_service, image, image_name)
+            return drive.allocate_file_id(self.drive_service)
 
         except Exception as e:
             logger.error(f"An Error occurred: {e}")
+
+
+_google_service = None
+_google_service_lock = threading.Lock()
+
+def get_google_service():
+    """Return the process-wide GoogleService, created on first use"""
+    global _google_service
+    if _google_service is None:
+        with _google_service_lock:
+            if _google_service is None:
+                _google_service = GoogleService()
+    return _google_service
@@ -0,0 +1,118 @@
+import io
+import asyncio
+import logging
+import config
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it photos are uploaded as-is
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# EXIF tags
+EXIF_DATETIME = 0x0132
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_GPS_IFD = 0x8825
+
+FORMAT_MIMETYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+}
+
+MIMETYPE_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+    'image/heic': 'heic',
+}
+
+_executor = ThreadPoolExecutor(max_workers=config.IMAGE_WORKERS, thread_name_prefix='image')
+
+def detect_mimetype(data):
+    """Detect the real image type from magic bytes instead of trusting the client"""
+    head = bytes(data[:12])
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head.startswith(b'GIF8'):
+        return 'image/gif'
+    if head[4:8] == b'ftyp' and head[8:12] in (b'heic', b'heix', b'mif1'):
+        return 'image/heic'
+    return None
+
+def extension_for(mimetype):
+    return MIMETYPE_EXTENSIONS.get(mimetype, 'jpg')
+
+def _kept_exif(exif):
+    """Build a minimal EXIF block holding only capture time and/or GPS, as configured"""
+    kept = Image.Exif()
+
+    if config.IMAGE_KEEP_CAPTURE_TIME:
+        captured_at = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+        if captured_at:
+            kept[EXIF_DATETIME] = captured_at
+
+    if config.IMAGE_KEEP_GPS:
+        gps = exif.get_ifd(EXIF_GPS_IFD)
+        if gps:
+            kept[EXIF_GPS_IFD] = gps
+
+    return kept
+
+def normalize_image(data):
+    """Resize to IMAGE_MAX_DIMENSION, re-encode as IMAGE_FORMAT and strip EXIF; returns (bytes, mimetype)"""
+    original_mimetype = detect_mimetype(data) or 'image/jpeg'
+
+    if Image is None or not config.IMAGE_PROCESSING_ENABLED:
+        return data, original_mimetype
+
+    max_dimension = config.IMAGE_MAX_DIMENSION
+    image_format = config.IMAGE_FORMAT
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # Let the JPEG decoder downscale while decoding; much cheaper than a full decode + resize
+            img.draft('RGB', (max_dimension, max_dimension))
+            exif = img.getexif()
+
+            # Apply the orientation tag to the pixels before the tag is dropped
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+            if image_format != 'PNG' and img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+
+            save_kwargs = {'quality': config.IMAGE_QUALITY}
+            if image_format == 'JPEG':
+                save_kwargs['optimize'] = True
+            kept = _kept_exif(exif)
+            if len(kept):
+                save_kwargs['exif'] = kept.tobytes()
+
+            out = io.BytesIO()
+            img.save(out, format=image_format, **save_kwargs)
+
+    except Exception as e:
+        logger.error(f"Image normalization failed, uploading original: {e}")
+        return data, original_mimetype
+
+    result = out.getvalue()
+    logger.info(f"Image normalized: {len(data)} -> {len(result)} bytes ({image_format})")
+    return result, FORMAT_MIMETYPES.get(image_format, 'image/jpeg')
+
+def submit_normalize(data):
+    """Run normalize_image on the image worker pool; returns a concurrent Future"""
+    return _executor.submit(normalize_image, data)
+
+async def normalize_image_async(data):
+    return await asyncio.wrap_future(submit_normalize(data))
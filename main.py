@@ -57,9 +57,17 @@ async def handle_photo_messages(update: Update, context: ContextTypes.DEFAULT_TY
     )
     await miniapp_handler.start_command(update, context)
 
-def main():
-    """Main function"""
-    application = Application.builder().token(config.TELEGRAM_TOKEN).build()
+def build_application(webhook=False):
+    """Build the bot Application with all handlers; webhook mode has no polling Updater"""
+    # Process updates from different users concurrently; Google I/O runs on the submission queue's workers
+    builder = (
+        Application.builder()
+        .token(config.TELEGRAM_TOKEN)
+        .concurrent_updates(config.BOT_CONCURRENT_UPDATES)
+    )
+    if webhook:
+        builder = builder.updater(None)
+    application = builder.build()
     
     # Handler untuk Web App data (prioritas tertinggi)
     application.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA, handle_webapp_data))
@@ -80,7 +88,11 @@ def main():
     
     # Handle all other text messages (redirect to start)
     application.add_handler(MessageHandler(filters.TEXT, handle_text_messages))
-    
+
+    return application
+
+def main():
+    """Main function"""
     print("🤖 Bot RLEGS Mini App berjalan...")
     print("📱 Mini App URL:", config.WEBAPP_URL)
     print("📝 User flow: /start → Mini App Form → Submit → Success")
@@ -88,7 +100,13 @@ def main():
     print("📊 Commands: /start, /help, /cancel")
     print("📋 Mode: Mini App Only (Manual input dihapus)")
     
-    application.run_polling()
+    if config.BOT_MODE == 'webhook':
+        import webhook_server
+        print(f"🌐 Webhook: {config.WEBHOOK_URL}{config.WEBHOOK_PATH} ({config.WEBHOOK_WORKERS} workers)")
+        webhook_server.run()
+    else:
+        application = build_application()
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
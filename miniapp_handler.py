@@ -1,15 +1,21 @@
 import json
+import asyncio
 import logging
-import base64
-from io import BytesIO
+import binascii
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import ContextTypes
-from validators import DataValidator
-from googleservice import GoogleService
+from submission_service import get_submission_service
 from enum import Enum
 
 logger = logging.getLogger(__name__)
 
+def decode_photo_data_url(foto_evidence):
+    """Decode a base64 photo (optionally a 'data:image/...;base64,' URL) straight to raw bytes"""
+    if foto_evidence.startswith('data:'):
+        # Only the short prefix is searched; the payload is sliced once instead of split into a list
+        foto_evidence = foto_evidence[foto_evidence.index(',', 0, 100) + 1:]
+    return binascii.a2b_base64(foto_evidence)
+
 class ConversationState(Enum):
     """Simplified states for mini app flow"""
     IDLE = "idle"
@@ -34,18 +40,13 @@ class UserSession:
 
 class MiniAppHandler:
     def __init__(self):
-        self.validator = DataValidator()
-        self.google_service = GoogleService()
+        self.submission_service = get_submission_service()
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command - show mini app button"""
         user = update.effective_user
         user_name = user.first_name if user.first_name else "User"
         
-        # Initialize Google services
-        self.google_service.authenticate()
-        self.google_service.build_services()
-        
         welcome_message = f"""
 👋 Halo *{user_name}*!
 
@@ -180,6 +181,11 @@ Atau klik tombol di bawah untuk membuka form:
             
             logger.info(f"Received web app data from user {user_id}: {webapp_data.keys()}")
             
+            # Current mini app: data and photo were already uploaded to the API, only a reference is sent
+            if 'submission_id' in webapp_data:
+                await self._track_reference(update, webapp_data, context)
+                return
+
             # Send processing message
             status_msg = await update.message.reply_text("⏳ **Memproses data dari form...**", parse_mode='Markdown')
             
@@ -204,8 +210,9 @@ Atau klik tombol di bawah untuk membuka form:
                 )
                 return
             
-            # Process and save data
-            await self._save_data_to_sheets(webapp_data, status_msg, user_id)
+            # Process and save data, using the validators' cleaned values
+            webapp_data.update(validation_result['values'])
+            await self._save_data_to_sheets(webapp_data, status_msg, user_id, context)
             
         except json.JSONDecodeError as e:
             logger.error(f"JSON decode error: {e}")
@@ -221,59 +228,7 @@ Atau klik tombol di bawah untuk membuka form:
     
     async def _validate_form_data(self, data):
         """Validate all form data"""
-        errors = []
-        
-        # Validate common fields
-        if not self.validator.validate_kode_sa(data.get('kode_sa', ''))[0]:
-            errors.append("Kode SA tidak valid")
-            
-        if not self.validator.validate_nama(data.get('nama', ''))[0]:
-            errors.append("Nama tidak valid")
-            
-        if not self.validator.validate_telepon(data.get('no_telp', ''))[0]:
-            errors.append("No. Telepon tidak valid")
-            
-        if not data.get('witel'):
-            errors.append("Witel harus dipilih")
-            
-        if not self.validator.validate_telda(data.get('telda', ''))[0]:
-            errors.append("Telkom Daerah tidak valid")
-            
-        if not self.validator.validate_tanggal(data.get('tanggal', ''))[0]:
-            errors.append("Tanggal tidak valid")
-            
-        if not data.get('kategori'):
-            errors.append("Kategori pelanggan harus dipilih")
-            
-        if not self.validator.validate_tenant(data.get('tenant', ''))[0]:
-            errors.append("Nama tenant tidak valid")
-            
-        if not data.get('kegiatan'):
-            errors.append("Kegiatan harus dipilih")
-        
-        # Validate activity-specific fields
-        kegiatan = data.get('kegiatan')
-        
-        if kegiatan == 'Visit':
-            if not data.get('layanan'):
-                errors.append("Layanan harus dipilih untuk Visit")
-            if not data.get('tarif'):
-                errors.append("Tarif harus dipilih untuk Visit")
-        elif kegiatan == 'Dealing':
-            if not data.get('paket_deal'):
-                errors.append("Paket deal harus dipilih untuk Dealing")
-            if not data.get('deal_bundling'):
-                errors.append("Deal bundling harus dipilih untuk Dealing")
-        
-        # Validate PIC fields
-        if not self.validator.validate_nama_pic(data.get('nama_pic', ''))[0]:
-            errors.append("Nama PIC tidak valid")
-            
-        if not self.validator.validate_nama_pic(data.get('jabatan_pic', ''))[0]:
-            errors.append("Jabatan PIC tidak valid")
-            
-        if not self.validator.validate_telepon_pic(data.get('telepon_pic', ''))[0]:
-            errors.append("Telepon PIC tidak valid")
+        errors, values = self.submission_service.clean(data)
         
         # Validate photo
         if not data.get('foto_evidence'):
@@ -285,77 +240,123 @@ Atau klik tombol di bawah untuk membuka form:
                 'message': "\n• ".join([""] + errors)
             }
         
-        return {'is_valid': True, 'message': 'All data valid'}
+        return {'is_valid': True, 'message': 'All data valid', 'values': values}
     
-    async def _save_data_to_sheets(self, data, status_msg, user_id):
+    async def _track_reference(self, update, reference, context):
+        """Acknowledge a submission the mini app uploaded itself and report when it is saved"""
+        user_id = update.effective_user.id
+        try:
+            submission_id = int(reference['submission_id'])
+        except (TypeError, ValueError):
+            submission_id = None
+        submission = submission_id and await asyncio.to_thread(
+            self.submission_service.find_reference, submission_id, reference.get('submission_uuid')
+        )
+
+        if not submission:
+            await update.message.reply_text("❌ **Error:** Data form tidak ditemukan di server.", parse_mode='Markdown')
+            return
+
+        activity_text = "Visit" if reference.get('kegiatan') == 'Visit' else "Dealing"
+        status_msg = await update.message.reply_text(
+            f"""📥 **Data {activity_text} Diterima!**
+
+🆔 **Kode SA:** {reference.get('kode_sa') or '-'}
+🧾 **No. Antrian:** {submission_id}
+⏳ **Status:** Sedang disimpan ke Google Sheet & Drive
+📱 **Input via:** Mini App Form
+
+Data sudah aman tersimpan di server, pesan ini akan diperbarui setelah selesai.""",
+            parse_mode='Markdown'
+        )
+
+        completion = self.submission_service.wait_async(submission_id)
+        context.application.create_task(self._report_saved(status_msg, reference, completion, user_id))
+        logger.info(f"Mini App submission {submission_id} referenced by user {user_id}")
+
+    async def _save_data_to_sheets(self, data, status_msg, user_id, context):
         """Save validated data to Google Sheets"""
         try:
-            # Initialize Google services
-            self.google_service.authenticate()
-            self.google_service.build_services()
-            
             await status_msg.edit_text("⏳ **Memproses foto...**", parse_mode='Markdown')
             
-            # Process photo
-            foto_evidence_b64 = data.get('foto_evidence')
-            if foto_evidence_b64.startswith('data:image'):
-                # Remove data URL prefix
-                foto_evidence_b64 = foto_evidence_b64.split(',')[1]
-            
-            image_bytes = base64.b64decode(foto_evidence_b64)
-            image_file = BytesIO(image_bytes)
-            image_file.seek(0)
+            # Older mini app builds embed the photo as base64; drop the string as soon as it is decoded
+            image_bytes = decode_photo_data_url(data.pop('foto_evidence'))
 
-            # Generate filename
-            kode_sa_string = data.get('kode_sa', 'unknown').replace('/', '_')
-            tanggal_string = data.get('tanggal', 'nodate').replace('/', '_')
-            kegiatan_string = data.get('kegiatan', 'data')
-            image_file_name = f"{kode_sa_string}_{tanggal_string}_{kegiatan_string}.jpg"
-
-            await status_msg.edit_text("⏳ **Mengupload foto ke Google Drive...**", parse_mode='Markdown')
+            # Persist locally first (already cleaned by _validate_form_data); the queue worker uploads and appends with retries
+            result = await self.submission_service.submit_async(
+                data, image_bytes, data.pop('submission_uuid', None), validate=False
+            )
+            if result.duplicate:
+                await self._report_duplicate(status_msg, result.submission_id)
+                return
 
-            # Upload to Drive
-            image_link = self.google_service.upload_to_drive(image_file, image_file_name)
-            
-            await status_msg.edit_text("⏳ **Menyimpan ke Google Sheet...**", parse_mode='Markdown')
-            
-            # Prepare data for sheets
+            submission_id = result.submission_id
             kegiatan = data.get('kegiatan')
+            activity_text = "Visit" if kegiatan == 'Visit' else "Dealing"
+
+            queued_msg = f"""📥 **Data {activity_text} Diterima!**
+
+🆔 **Kode SA:** {data.get('kode_sa', '-')}
+🧾 **No. Antrian:** {submission_id}
+⏳ **Status:** Sedang disimpan ke Google Sheet & Drive
+📱 **Input via:** Mini App Form
+
+Data sudah aman tersimpan di server, pesan ini akan diperbarui setelah selesai."""
+
+            try:
+                await status_msg.edit_text(queued_msg, parse_mode='Markdown')
+            finally:
+                context.application.create_task(self._report_saved(status_msg, data, result.completion, user_id))
+
+            logger.info(f"Mini App data queued as submission {submission_id} for user {user_id}")
+                
+        except Exception as e:
+            logger.error(f"Error saving Mini App data: {e}")
             
-            # Set default values based on activity type
-            if kegiatan == 'Visit':
-                data['paket_deal'] = data.get('paket_deal', '-')
-                data['deal_bundling'] = data.get('deal_bundling', '-')
-            else:  # Dealing
-                data['layanan'] = data.get('layanan', '-')
-                data['tarif'] = data.get('tarif', '-')
-
-            # Standard order for all data: 17 fields total
-            ordered_data = [
-                data.get('kode_sa', '-'),      # 1
-                data.get('nama', '-'),         # 2
-                data.get('no_telp', '-'),      # 3
-                data.get('witel', '-'),        # 4
-                data.get('telda', '-'),        # 5
-                data.get('tanggal', '-'),      # 6
-                data.get('kategori', '-'),     # 7
-                data.get('tenant', '-'),       # 8
-                data.get('kegiatan', '-'),     # 9
-                data.get('layanan', '-'),      # 10
-                data.get('tarif', '-'),        # 11
-                data.get('nama_pic', '-'),     # 12
-                data.get('jabatan_pic', '-'),  # 13
-                data.get('telepon_pic', '-'),  # 14
-                data.get('paket_deal', '-'),   # 15
-                data.get('deal_bundling', '-'), # 16
-                image_link,                    # 17
+            keyboard = [
+                [InlineKeyboardButton("🔄 Coba Lagi", callback_data='back_to_menu')],
             ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            await status_msg.edit_text(
+                "❌ **Terjadi kesalahan sistem**\n\n"
+                "Silakan coba lagi.",
+                parse_mode='Markdown',
+                reply_markup=reply_markup
+            )
 
-            logger.info(f"Data to submit: {ordered_data}")
+    async def _report_duplicate(self, status_msg, submission_id):
+        """Tell the user this form was already received instead of saving it twice"""
+        submission = await asyncio.to_thread(self.submission_service.queue.get, submission_id) or {}
+        status_text = {
+            'done': 'sudah tersimpan ke Google Sheet & Drive',
+            'pending': 'sedang disimpan',
+        }.get(submission.get('status'), 'gagal disimpan, hubungi administrator')
 
-            # Save to sheets
-            success, message = self.google_service.append_to_sheet([ordered_data])
-            
+        keyboard = [
+            [InlineKeyboardButton("🚀 Input Data Baru", callback_data='back_to_menu')],
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        await status_msg.edit_text(
+            f"ℹ️ **Data ini sudah pernah dikirim**\n\n"
+            f"🧾 **No. Antrian:** {submission_id}\n"
+            f"📌 **Status:** {status_text}",
+            parse_mode='Markdown',
+            reply_markup=reply_markup
+        )
+
+    async def _report_saved(self, status_msg, data, completion, user_id):
+        """Update the acknowledgement message once the queue worker has finished a submission"""
+        # Scheduled after the "queued" acknowledgement, so a fast worker's result can't be overwritten by it
+        submission, success = await completion
+        if success is None:
+            # Still retrying; the "queued" message stays and the submission is visible in the queue
+            return
+
+        activity_text = "Visit" if data.get('kegiatan') == 'Visit' else "Dealing"
+
+        try:
             if success:
                 # Success message with restart option
                 keyboard = [
@@ -363,8 +364,6 @@ Atau klik tombol di bawah untuk membuka form:
                 ]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 
-                activity_text = "Visit" if kegiatan == 'Visit' else "Dealing"
-                
                 final_msg = f"""🎉 **Data {activity_text} Berhasil Disimpan!**
 
 🆔 **Kode SA:** {data.get('kode_sa', '-')}
@@ -381,27 +380,20 @@ Atau klik tombol di bawah untuk membuka form:
                 logger.info(f"✅ Data saved successfully via Mini App for user {user_id}")
                 
             else:
-                # Error with retry button
+                # The submission stays in the local queue for an administrator to retry
                 keyboard = [
-                    [InlineKeyboardButton("🔄 Coba Lagi", callback_data='back_to_menu')],
+                    [InlineKeyboardButton("🔄 Kembali ke Menu", callback_data='back_to_menu')],
                 ]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 
-                error_msg = f"❌ **Gagal Menyimpan Data**\n\nError: {message}\n\n🔄 **Opsi:**"
+                error_msg = (
+                    f"❌ **Gagal Menyimpan Data**\n\n"
+                    f"Error: {submission.get('last_error') if submission else '-'}\n\n"
+                    f"Data tetap tersimpan di antrian server (No. {submission.get('id') if submission else '-'}), "
+                    "hubungi administrator."
+                )
                 
                 await status_msg.edit_text(error_msg, parse_mode='Markdown', reply_markup=reply_markup)
-                
+
         except Exception as e:
-            logger.error(f"Error saving Mini App data: {e}")
-            
-            keyboard = [
-                [InlineKeyboardButton("🔄 Coba Lagi", callback_data='back_to_menu')],
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await status_msg.edit_text(
-                "❌ **Terjadi kesalahan sistem**\n\n"
-                "Silakan coba lagi.",
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
\ No newline at end of file
+            logger.error(f"Could not update status message for user {user_id}: {e}")
@@ -0,0 +1,72 @@
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+import config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    digest TEXT PRIMARY KEY,
+    file_id TEXT,
+    link TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+def content_digest(image_bytes):
+    """SHA-256 of the bytes that would be uploaded (after normalisation, so re-encoding is deterministic)"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+class PhotoStore:
+    """Content-addressed index of uploaded evidence photos: SHA-256 -> Drive file id and link.
+
+    Consulted before an upload so the same photo reused for a Visit and a later Dealing
+    is linked to the existing Drive file instead of being uploaded again.
+    """
+    def __init__(self, db_path=None):
+        self.db_path = db_path or config.PHOTO_STORE_DB_PATH
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+
+    def lookup(self, digest):
+        """(file_id, link) of an earlier upload with this digest, or None"""
+        with self._db_lock:
+            row = self._conn.execute("SELECT file_id, link FROM photos WHERE digest = ?", (digest,)).fetchone()
+        if row:
+            logger.info(f"Photo {digest[:12]} already on Drive: {row[1]}")
+        return tuple(row) if row else None
+
+    def remember(self, digest, file_id, link):
+        if not digest or not link:
+            return
+        with self._db_lock:
+            # First upload wins; concurrent uploads of the same photo keep pointing at one file
+            self._conn.execute(
+                "INSERT OR IGNORE INTO photos (digest, file_id, link, created_at) VALUES (?, ?, ?, ?)",
+                (digest, file_id, link, time.time())
+            )
+
+
+_photo_store = None
+_photo_store_lock = threading.Lock()
+
+def get_photo_store():
+    """Return the process-wide PhotoStore shared by the submission queue and the bulk import"""
+    global _photo_store
+    if _photo_store is None:
+        with _photo_store_lock:
+            if _photo_store is None:
+                _photo_store = PhotoStore()
+    return _photo_store
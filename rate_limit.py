@@ -0,0 +1,187 @@
+import json
+import time
+import random
+import logging
+import threading
+import config
+
+from email.utils import parsedate_to_datetime
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+logger = logging.getLogger(__name__)
+
+# 5xx can arrive after the server committed the write, so they are only retried for idempotent requests
+SERVER_ERROR_STATUSES = (500, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+# Drive and Sheets also report quota exhaustion as 403 with one of these reasons
+RATE_LIMIT_REASONS = (b'rateLimitExceeded', b'userRateLimitExceeded', b'RATE_LIMIT_EXCEEDED')
+
+class TokenBucket:
+    """Blocking token bucket: rate_per_minute tokens refill continuously, up to burst tokens saved"""
+    def __init__(self, name, rate_per_minute, burst=None):
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst or max(1, rate_per_minute // 6)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.waiting = 0      # callers currently blocked in acquire()
+        self.throttled = 0    # 429/quota responses seen
+        self.retries = 0
+
+    def _wait_time(self):
+        """Seconds until a token is free, taking one if available; caller holds the lock"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        with self._lock:
+            delay = self._wait_time()
+            if not delay:
+                return
+            self.waiting += 1
+        try:
+            while delay:
+                time.sleep(delay)
+                with self._lock:
+                    delay = self._wait_time()
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def pause(self, seconds):
+        """Hold every caller back after the server said the quota is exhausted"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self.throttled += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate_per_minute': round(self.rate * 60),
+                'waiting': self.waiting,
+                'throttled': self.throttled,
+                'retries': self.retries,
+            }
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_bucket(uri):
+    """Bucket for the API a request URI belongs to (sheets or drive), None for anything else"""
+    if 'sheets.googleapis.com' in uri:
+        name, rate = 'sheets', config.SHEETS_REQUESTS_PER_MINUTE
+    elif '/drive/' in uri:
+        name, rate = 'drive', config.DRIVE_REQUESTS_PER_MINUTE
+    else:
+        return None
+
+    bucket = _buckets.get(name)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.setdefault(name, TokenBucket(name, rate))
+    return bucket
+
+def is_rate_limited(error):
+    """429, or 403 with a quota reason: the request was rejected before doing anything"""
+    status = error.resp.status
+    if status == 429:
+        return True
+    return status == 403 and any(reason in error.content for reason in RATE_LIMIT_REASONS)
+
+def is_retryable(error, idempotent=True):
+    """Rate limits are always safe to retry; 5xx only when repeating the request can't duplicate its effect"""
+    if is_rate_limited(error):
+        return True
+    return idempotent and error.resp.status in SERVER_ERROR_STATUSES
+
+def retry_after(error):
+    """Seconds from a Retry-After header (delta or HTTP date), or None"""
+    value = error.resp.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(error, attempt):
+    """Retry-After when the server sent one, else exponential backoff with full jitter"""
+    delay = retry_after(error)
+    if delay is not None:
+        return delay + random.uniform(0, 1)
+    return random.uniform(0, min(config.GOOGLE_RETRY_MAX_SECONDS, config.GOOGLE_RETRY_BASE_SECONDS * 2 ** attempt))
+
+def call_with_limits(bucket, call, description, idempotent=True):
+    """Run call() under the bucket, retrying 429 and quota errors, and 5xx when idempotent"""
+    attempt = 0
+    while True:
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            return call()
+        except HttpError as e:
+            if attempt >= config.GOOGLE_MAX_RETRIES or not is_retryable(e, idempotent):
+                raise
+            delay = backoff_delay(e, attempt)
+            if bucket is not None:
+                bucket.record_retry()
+                if is_rate_limited(e):
+                    bucket.pause(delay)
+            logger.warning(f"{description} got HTTP {e.resp.status}, retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+class RateLimitedRequest(HttpRequest):
+    """HttpRequest whose execute() and next_chunk() go through the per-API token bucket and retry policy.
+
+    GoogleService builds its Sheets and Drive clients with this class, so every .execute() is covered.
+    """
+    def is_idempotent(self):
+        """GET/PUT/DELETE, or a create that carries a reserved id (a repeat fails with 409 instead of duplicating)"""
+        if self.method in IDEMPOTENT_METHODS:
+            return True
+        if self.method != 'POST' or not self.body:
+            return False
+        try:
+            body = json.loads(self.body)
+        except (TypeError, ValueError):
+            return False  # e.g. a multipart media upload
+        return isinstance(body, dict) and bool(body.get('id'))
+
+    def execute(self, http=None, num_retries=0):
+        return call_with_limits(
+            get_bucket(self.uri), lambda: super(RateLimitedRequest, self).execute(http=http, num_retries=num_retries),
+            f"{self.method} {self.methodId or self.uri}", self.is_idempotent()
+        )
+
+    def next_chunk(self, http=None, num_retries=0):
+        # A failed chunk leaves the upload in its error state; calling again resumes from Drive's offset
+        return call_with_limits(
+            get_bucket(self.uri), lambda: super(RateLimitedRequest, self).next_chunk(http=http, num_retries=num_retries),
+            f"upload {self.methodId or self.uri}"
+        )
+
+def stats():
+    """Per-API limiter state (queue depth, throttles, retries) for /api/metrics"""
+    with _buckets_lock:
+        buckets = list(_buckets.values())
+    return {bucket.name: bucket.stats() for bucket in buckets}
@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import struct
+import sqlite3
+import logging
+import threading
+import config
+
+try:
+    import redis
+except ImportError:  # Only needed for SESSION_BACKEND=redis
+    redis = None
+
+from conversation_states import ConversationState
+
+logger = logging.getLogger(__name__)
+
+# Payload layout: version (8 bytes) + header length (4 bytes) + JSON header + raw photo bytes.
+# The photo is kept out of the JSON so it is neither base64-inflated nor re-parsed.
+_PREFIX = struct.Struct('>QI')
+PHOTO_FIELD = 'foto_evidence'
+
+def dump_session(session, version):
+    """Serialise a UserSession (state, history and record) to bytes"""
+    data = session.data.to_dict()
+    photo = data.pop(PHOTO_FIELD, None)
+    header = json.dumps({
+        'state': session.state.value,
+        'history': [state.value for state in session.history],
+        'data': data,
+        'has_photo': photo is not None,
+        'foto_file_id': session.foto_file_id,
+        'last_message_id': session.last_message_id,
+    }, separators=(',', ':')).encode('utf-8')
+    return _PREFIX.pack(version, len(header)) + header + (bytes(photo) if photo else b'')
+
+def payload_version(payload):
+    return _PREFIX.unpack_from(payload)[0]
+
+def restore_session(session, payload):
+    """Load a payload produced by dump_session into session; returns its version"""
+    version, header_length = _PREFIX.unpack_from(payload)
+    offset = _PREFIX.size
+    header = json.loads(payload[offset:offset + header_length])
+
+    session.reset()
+    for field, value in header['data'].items():
+        session.data[field] = value
+    if header['has_photo']:
+        session.data[PHOTO_FIELD] = bytes(payload[offset + header_length:])
+
+    session.history = [ConversationState(state) for state in header['history']]
+    session.foto_file_id = header['foto_file_id']
+    session.last_message_id = header['last_message_id']
+    session.state = ConversationState(header['state'])
+    return version
+
+class SessionBackend:
+    """Persistence behind SessionManager. Payloads are opaque bytes from dump_session"""
+    # True when other processes can write the same sessions, so cached copies must be re-validated
+    shared = False
+
+    def load(self, user_id):
+        raise NotImplementedError
+
+    def version(self, user_id):
+        payload = self.load(user_id)
+        return payload_version(payload) if payload is not None else None
+
+    def save_many(self, payloads):
+        """Write {user_id: payload} in one batch"""
+        raise NotImplementedError
+
+    def delete(self, user_id):
+        raise NotImplementedError
+
+    def purge(self, older_than):
+        """Remove sessions last written before the given time.time(); returns how many"""
+        return 0
+
+    def close(self):
+        pass
+
+class MemorySessionBackend(SessionBackend):
+    """Process-local backend; useful for tests and single-process development"""
+    def __init__(self):
+        self._payloads = {}  # user_id -> (payload, written_at)
+        self._lock = threading.Lock()
+
+    def load(self, user_id):
+        with self._lock:
+            entry = self._payloads.get(user_id)
+        return entry[0] if entry else None
+
+    def save_many(self, payloads):
+        now = time.time()
+        with self._lock:
+            for user_id, payload in payloads.items():
+                self._payloads[user_id] = (payload, now)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._payloads.pop(user_id, None)
+
+    def purge(self, older_than):
+        with self._lock:
+            stale = [user_id for user_id, (_, written_at) in self._payloads.items() if written_at < older_than]
+            for user_id in stale:
+                del self._payloads[user_id]
+        return len(stale)
+
+class SQLiteSessionBackend(SessionBackend):
+    """SQLite in WAL mode; several bot processes on one host can share the file"""
+    shared = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL,
+        payload BLOB NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at);
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or config.SESSION_DB_PATH
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # Losing the last few hundred ms of a form on power loss is acceptable; fsync per write is not needed
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+
+    def load(self, user_id):
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def version(self, user_id):
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def save_many(self, payloads):
+        now = time.time()
+        rows = [(user_id, payload_version(payload), payload, now) for user_id, payload in payloads.items()]
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany(
+                    "INSERT INTO sessions (user_id, version, payload, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET version = excluded.version, "
+                    "payload = excluded.payload, updated_at = excluded.updated_at",
+                    rows
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def delete(self, user_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def purge(self, older_than):
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (older_than,)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class RedisSessionBackend(SessionBackend):
+    """Any Redis-protocol server; keys expire on their own after the idle timeout"""
+    shared = True
+
+    def __init__(self, client=None, prefix='session:', ttl=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package")
+            client = redis.Redis.from_url(config.SESSION_REDIS_URL)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl if ttl is not None else config.SESSION_IDLE_TIMEOUT_SECONDS
+
+    def _key(self, user_id):
+        return f"{self.prefix}{user_id}"
+
+    def load(self, user_id):
+        return self.client.get(self._key(user_id))
+
+    def version(self, user_id):
+        # Only the 8-byte version prefix crosses the network
+        head = self.client.getrange(self._key(user_id), 0, 7)
+        return struct.unpack('>Q', head)[0] if len(head) == 8 else None
+
+    def save_many(self, payloads):
+        pipe = self.client.pipeline(transaction=False)
+        for user_id, payload in payloads.items():
+            pipe.set(self._key(user_id), payload, ex=self.ttl or None)
+        pipe.execute()
+
+    def delete(self, user_id):
+        self.client.delete(self._key(user_id))
+
+    def close(self):
+        self.client.close()
+
+def create_session_backend(name=None):
+    """Backend selected by SESSION_BACKEND; None keeps sessions in the manager's memory only"""
+    name = (config.SESSION_BACKEND if name is None else name).lower()
+    if not name:
+        return None
+    if name == 'memory':
+        return MemorySessionBackend()
+    if name == 'sqlite':
+        return SQLiteSessionBackend()
+    if name == 'redis':
+        return RedisSessionBackend()
+    raise ValueError(f"Unknown SESSION_BACKEND: {name}")
+
+
+def self_test():
+    """Round-trip a half-filled session through every backend; Redis runs against a local stand-in"""
+    import tempfile
+    from conversation_states import UserSession
+
+    class LocalRedisStandIn:
+        """The few Redis commands RedisSessionBackend uses, with Redis semantics"""
+        def __init__(self):
+            self.store = {}
+
+        def get(self, key):
+            return self.store.get(key)
+
+        def getrange(self, key, start, end):
+            return self.store.get(key, b'')[start:end + 1]
+
+        def set(self, key, value, ex=None):
+            self.store[key] = bytes(value)
+
+        def delete(self, key):
+            self.store.pop(key, None)
+
+        def pipeline(self, transaction=True):
+            return self
+
+        def execute(self):
+            return []
+
+        def close(self):
+            pass
+
+    session = UserSession(42)
+    session.add_data('kode_sa', 'SA001')
+    session.add_data('nama', 'Budi Santoso')
+    session.add_data('foto_evidence', b'\xff\xd8\xff' + os.urandom(2048))
+    session.history = [ConversationState.WAITING_KODE_SA, ConversationState.WAITING_NAMA]
+    session.state = ConversationState.WAITING_TELEPON
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            'memory': MemorySessionBackend(),
+            'sqlite': SQLiteSessionBackend(os.path.join(tmp, 'sessions.sqlite3')),
+            'redis': RedisSessionBackend(LocalRedisStandIn(), ttl=60),
+        }
+        for name, backend in backends.items():
+            backend.save_many({42: dump_session(session, 3)})
+            restored = UserSession(42)
+            version = restore_session(restored, backend.load(42))
+
+            ok = (
+                version == 3 and backend.version(42) == 3
+                and restored.state == session.state
+                and restored.history == session.history
+                and restored.data.to_dict() == session.data.to_dict()
+            )
+            backend.delete(42)
+            ok = ok and backend.load(42) is None
+            print(f"{'✅' if ok else '❌'} {name}: {len(dump_session(session, 3))} byte payload round-trip")
+            backend.close()
+
+# Self test jika file dijalankan langsung
+if __name__ == "__main__":
+    self_test()
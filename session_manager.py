@@ -1,26 +1,257 @@
+import sys
+import time
+import asyncio
+import logging
+import config
+
+from collections import OrderedDict
 from conversation_states import UserSession, ConversationState
+from session_backends import create_session_backend, dump_session, restore_session
+
+logger = logging.getLogger(__name__)
+
+# Rough fixed cost of a session: the UserSession, its VisitRecord and the history list
+SESSION_OVERHEAD_BYTES = 1024
+
+def estimate_session_size(session):
+    """Approximate memory held by a session; dominated by the evidence photo bytes"""
+    size = SESSION_OVERHEAD_BYTES + 8 * len(session.history)
+    for value in session.data.values():
+        if isinstance(value, (str, bytes, bytearray)):
+            size += len(value)
+        elif value is not None:
+            size += sys.getsizeof(value)
+    return size
 
 class SessionManager:
     """Manager untuk handle multiple user sessions"""
-    def __init__(self):
-        self.sessions = {}  # user_id -> UserSession
-    
+    def __init__(self, idle_timeout=None, max_bytes=None, sweep_interval=None, backend=None, flush_delay_ms=None):
+        self.idle_timeout = idle_timeout if idle_timeout is not None else config.SESSION_IDLE_TIMEOUT_SECONDS
+        self.max_bytes = max_bytes if max_bytes is not None else config.SESSION_MAX_BYTES
+        self.sweep_interval = sweep_interval if sweep_interval is not None else config.SESSION_SWEEP_INTERVAL_SECONDS
+
+        self.sessions = OrderedDict()  # user_id -> UserSession, least recently used first
+        self._sizes = {}  # user_id -> estimated bytes
+        self.total_bytes = 0
+        self._active_count = 0
+        self._sweeper = None
+
+        # Optional persistence; the in-memory sessions act as a cache in front of it
+        self.backend = backend if backend is not None else create_session_backend()
+        self.flush_delay = (flush_delay_ms if flush_delay_ms is not None else config.SESSION_FLUSH_DELAY_MS) / 1000.0
+        self._versions = {}  # user_id -> version last loaded or written by this process
+        self._dirty = {}  # user_id -> UserSession waiting to be written
+        self._flusher = None
+
+    def _on_state_change(self, session, was_active, is_active):
+        self._active_count += 1 if is_active else -1
+
+    def _on_data_change(self, session):
+        # Count a photo as soon as it is stored, not when the user next sends an update
+        if self.sessions.get(session.user_id) is session:
+            self._resize(session.user_id, session)
+            self._enforce_max_bytes()
+
+    def _new_session(self, user_id):
+        session = UserSession(user_id, on_state_change=self._on_state_change, on_data_change=self._on_data_change)
+        self.sessions[user_id] = session
+        return session
+
     def get_session(self, user_id):
-        """Get or create session for user"""
-        if user_id not in self.sessions:
-            self.sessions[user_id] = UserSession(user_id)
-        return self.sessions[user_id]
-    
+        """Get or create session for user (blocking: may read the backend)"""
+        session = self.sessions.get(user_id)
+        if self.backend is not None and (session is None or self.backend.shared):
+            session = self._load(user_id, session)
+        return self._touch(user_id, session)
+
+    async def get_session_async(self, user_id):
+        """get_session for handlers on the event loop: backend reads run in a worker thread"""
+        session = self.sessions.get(user_id)
+        if self.backend is not None and (session is None or self.backend.shared):
+            cached = self._cached(user_id, session)
+            if cached is not None:
+                session = cached
+            else:
+                payload = await asyncio.to_thread(self._fetch, user_id, session)
+                # The cache may have changed while the backend was read
+                session = self.sessions.get(user_id)
+                session = self._cached(user_id, session) or self._apply(user_id, session, payload)
+        return self._touch(user_id, session)
+
+    def _touch(self, user_id, session):
+        if session is None:
+            session = self._new_session(user_id)
+        else:
+            self.sessions.move_to_end(user_id)
+
+        session.last_active = time.monotonic()
+        # Fields cleared since the last update (going back, reset) only show up here
+        self._resize(user_id, session)
+        self._enforce_max_bytes()
+        self._ensure_sweeper()
+        return session
+
     def reset_session(self, user_id):
         """Reset specific user session"""
         if user_id in self.sessions:
-            self.sessions[user_id].reset()
-    
+            session = self.sessions[user_id]
+            session.reset()
+            self._resize(user_id, session)
+
     def delete_session(self, user_id):
         """Delete user session"""
-        if user_id in self.sessions:
-            del self.sessions[user_id]
-    
+        self._evict(user_id)
+        self._dirty.pop(user_id, None)
+        self._versions.pop(user_id, None)
+        if self.backend is not None:
+            self.backend.delete(user_id)
+
     def get_active_sessions_count(self):
         """Get number of active sessions"""
-        return len([s for s in self.sessions.values() if s.state != ConversationState.IDLE])
+        return self._active_count
+
+    # ========== PERSISTENCE ==========
+
+    def _load(self, user_id, session):
+        """Return the cached session, refreshed from the backend when another process wrote a newer version"""
+        cached = self._cached(user_id, session)
+        if cached is not None:
+            return cached
+        return self._apply(user_id, session, self._fetch(user_id, session))
+
+    def _cached(self, user_id, session):
+        """The in-memory session when it has unflushed changes (those win over the backend), else None"""
+        if user_id not in self._dirty:
+            return None
+        if session is None:
+            # Evicted from memory before its pending write went out; take the same object back
+            session = self._dirty[user_id]
+            session.on_state_change = self._on_state_change
+            session.on_data_change = self._on_data_change
+            if session.state != ConversationState.IDLE:
+                self._active_count += 1
+            self.sessions[user_id] = session
+        return session
+
+    def _fetch(self, user_id, session):
+        """Backend I/O only (safe off the event loop): the stored payload, or None when the cached copy is current"""
+        if session is not None:
+            remote_version = self.backend.version(user_id)
+            if remote_version is None or remote_version == self._versions.get(user_id):
+                return None
+        return self.backend.load(user_id)
+
+    def _apply(self, user_id, session, payload):
+        if payload is None:
+            return session
+        if session is None:
+            session = self._new_session(user_id)
+        self._versions[user_id] = restore_session(session, payload)
+        return session
+
+    def save(self, user_id):
+        """Mark a session as changed; writes within flush_delay are coalesced into one backend batch"""
+        if self.backend is None or user_id not in self.sessions:
+            return
+        self._dirty[user_id] = self.sessions[user_id]
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flusher is None or self._flusher.done():
+            self._flusher = loop.create_task(self._flush_later())
+
+    def _take_dirty(self):
+        payloads = {}
+        for user_id, session in self._dirty.items():
+            version = self._versions.get(user_id, 0) + 1
+            self._versions[user_id] = version
+            payloads[user_id] = dump_session(session, version)
+        self._dirty.clear()
+        return payloads
+
+    def flush(self):
+        """Write pending sessions now (blocking)"""
+        if self.backend is None or not self._dirty:
+            return
+        self.backend.save_many(self._take_dirty())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        # Serialised on the loop so no handler mutates a session mid-dump; written off the loop
+        pending = dict(self._dirty)
+        payloads = self._take_dirty()
+        if not payloads:
+            return
+        try:
+            await asyncio.to_thread(self.backend.save_many, payloads)
+        except Exception as e:
+            logger.error(f"Could not persist {len(payloads)} sessions: {e}")
+            for user_id, session in pending.items():
+                self._dirty.setdefault(user_id, session)
+
+    # ========== EVICTION ==========
+
+    def _evict(self, user_id):
+        session = self.sessions.pop(user_id, None)
+        if session is None:
+            return
+        self.total_bytes -= self._sizes.pop(user_id, 0)
+        if session.state != ConversationState.IDLE:
+            self._active_count -= 1
+        session.on_state_change = None
+        session.on_data_change = None
+
+    def _resize(self, user_id, session):
+        size = estimate_session_size(session)
+        self.total_bytes += size - self._sizes.get(user_id, 0)
+        self._sizes[user_id] = size
+
+    def _enforce_max_bytes(self):
+        """Evict least recently used sessions until under max_bytes; the session just touched is always kept"""
+        while self.total_bytes > self.max_bytes and len(self.sessions) > 1:
+            user_id = next(iter(self.sessions))
+            logger.info(f"Evicting session {user_id}: session store over {self.max_bytes} bytes")
+            # Only dropped from memory; a persistent backend still has it (pending writes are kept in _dirty)
+            self._evict(user_id)
+
+    def sweep(self):
+        """Drop cached sessions idle for longer than idle_timeout; returns how many were removed"""
+        deadline = time.monotonic() - self.idle_timeout
+        removed = 0
+        # Ordered by last access, so stop at the first session that is still fresh
+        while self.sessions:
+            user_id, session = next(iter(self.sessions.items()))
+            if session.last_active > deadline:
+                break
+            # Stored copies expire through backend.purge(), which sees writes from every process
+            self._evict(user_id)
+            self._versions.pop(user_id, None)
+            removed += 1
+
+        if removed:
+            logger.info(f"Session sweep removed {removed} idle sessions ({len(self.sessions)} left, ~{self.total_bytes} bytes)")
+        return removed
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None and not self._sweeper.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Not on an event loop; sweep() can still be called directly
+        self._sweeper = loop.create_task(self._sweep_periodically())
+
+    async def _sweep_periodically(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+                if self.backend is not None:
+                    purged = await asyncio.to_thread(self.backend.purge, time.time() - self.idle_timeout)
+                    if purged:
+                        logger.info(f"Session sweep purged {purged} stored sessions")
+            except Exception as e:
+                logger.error(f"Session sweep failed: {e}")
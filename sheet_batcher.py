@@ -0,0 +1,165 @@
+import time
+import queue
+import logging
+import threading
+import config
+
+import spreadsheet
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+LAST_COLUMN = spreadsheet.LAST_COLUMN
+
+class SheetBatcher:
+    """Write-behind batcher: coalesces rows submitted within a short window into one values().append call"""
+    def __init__(self, service_provider, window_ms=None, max_rows=None):
+        # service_provider returns a ready Sheets client; called on the writer thread
+        self.service_provider = service_provider
+        self.window = (window_ms if window_ms is not None else config.SHEET_BATCH_WINDOW_MS) / 1000.0
+        self.max_rows = max_rows or config.SHEET_BATCH_MAX_ROWS
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, rows: list):
+        """Queue rows for appending; the Future resolves to (status, range or error message)"""
+        if not isinstance(rows, list):
+            raise TypeError("Data passed must be of 'list' type")
+
+        future = Future()
+        self._ensure_started()
+        self._queue.put((rows, future))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sheet-batcher', daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self):
+        """Block for the first submission, then gather more until the window closes or the batch is full"""
+        batch = [self._queue.get()]
+        row_count = len(batch[0][0])
+        deadline = time.monotonic() + self.window
+
+        while row_count < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            row_count += len(item[0])
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                self._flush(batch)
+            except Exception as e:
+                # _flush resolves futures itself; this only guards the writer thread
+                logger.error(f"Sheet batcher error: {e}")
+
+    def _flush(self, batch):
+        all_rows = [row for rows, _ in batch for row in rows]
+
+        try:
+            service = self.service_provider()
+            updated_range = spreadsheet.append_rows(service, all_rows)
+        except Exception as e:
+            # The sheet may have been cleared or replaced; verify the header again next time
+            spreadsheet.invalidate_header_cache()
+
+            error_msg = f"Error menyimpan data: {e}"
+            logger.error(error_msg)
+            for _, future in batch:
+                future.set_result((False, error_msg))
+            return
+
+        logger.info(f"Appended {len(all_rows)} rows from {len(batch)} submissions: {updated_range}")
+
+        first_row, _ = spreadsheet.parse_row_range(updated_range)
+
+        for rows, future in batch:
+            if first_row is None:
+                future.set_result((True, updated_range))
+                continue
+            last_row = first_row + len(rows) - 1
+            future.set_result((True, f"{spreadsheet.SHEET_NAME}!A{first_row}:{LAST_COLUMN}{last_row}"))
+            first_row = last_row + 1
+
+
+def stress_test(submissions=500, threads=50):
+    """Fire many concurrent submissions at an in-memory fake Sheets API and check no row is lost"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    class FakeRequest:
+        def __init__(self, fn):
+            self.execute = fn
+
+    class FakeSheetsService:
+        """Just enough of spreadsheets().values() for append_rows; append is atomic like the real API"""
+        def __init__(self):
+            self.rows = []
+            self.lock = threading.Lock()
+            self.append_calls = 0
+
+        def spreadsheets(self):
+            return self
+
+        def values(self):
+            return self
+
+        def get(self, spreadsheetId, range):
+            return FakeRequest(lambda: {'values': self.rows[:1]} if self.rows else {})
+
+        def update(self, spreadsheetId, range, valueInputOption, body):
+            def run():
+                with self.lock:
+                    self.rows[0:len(body['values'])] = body['values']
+                return {}
+            return FakeRequest(run)
+
+        def batchUpdate(self, spreadsheetId, body):
+            return FakeRequest(lambda: {})
+
+        def append(self, spreadsheetId, range, valueInputOption, insertDataOption, body):
+            def run():
+                time.sleep(0.01)  # simulated network latency
+                with self.lock:
+                    self.append_calls += 1
+                    first_row = len(self.rows) + 1
+                    self.rows.extend(body['values'])
+                    return {'updates': {'updatedRange': f"{spreadsheet.SHEET_NAME}!A{first_row}:{LAST_COLUMN}{len(self.rows)}"}}
+            return FakeRequest(run)
+
+    service = FakeSheetsService()
+    batcher = SheetBatcher(lambda: service)
+
+    def submit(i):
+        return batcher.submit([[f"SA{i:05d}"] + ['-'] * 16]).result()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(submit, range(submissions)))
+
+    written = [row[0] for row in service.rows[1:]]
+    ranges = [msg for status, msg in results if status]
+
+    print(f"🧪 {submissions} submissions from {threads} threads -> {service.append_calls} append calls")
+    print(f"{'✅' if sorted(written) == [f'SA{i:05d}' for i in range(submissions)] else '❌'} every row written exactly once ({len(written)} rows)")
+    print(f"{'✅' if len(set(ranges)) == submissions else '❌'} every caller got a distinct row range")
+    last_row = max(spreadsheet.parse_row_range(msg)[1] for msg in ranges)
+    print(f"{'✅' if last_row == submissions + 1 else '❌'} row ranges end at the last data row: {last_row}")
+
+# Stress test jika file dijalankan langsung
+if __name__ == "__main__":
+    stress_test()
@@ -1,7 +1,10 @@
 import os.path
 import pickle
+import re
 import config
 import logging
+import threading
+import form_schema
 
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -9,63 +12,106 @@ from googleapiclient.discovery import build
 
 logger = logging.getLogger(__name__)
 
-HEADER_DATA = [
-    ["Kode SA", "Nama Lengkap", "Nomor HP SA", "Witel", "Telkom Daerah", "Tanggal Visit", "Kategori Pelanggan", "Nama Tenant / Desa / Puskesmas / Kecamatan yang divisit", "Kegiatan", "Layanan Saat Ini", "Tarif Layanan Saat Ini", "Nama PIC Pelanggan", "Jabatan PIC", "Nomor HP PIC Pelanggan", "Deal Paket Berapa Mbps", "Dealing Layanan Bundling", "Foto Evidence Visit"]
-]
+HEADER_DATA = [form_schema.HEADER]
+
+# Submission keys in HEADER_DATA column order; every entry point builds its row from this
+ROW_FIELDS = form_schema.FIELD_NAMES
+
+LAST_COLUMN = chr(ord('A') + len(ROW_FIELDS) - 1)
+
+SHEET_NAME = 'Sheet1'
+
+# Set once the header row has been verified/created; cleared via invalidate_header_cache()
+_header_ready = False
+_header_lock = threading.Lock()
+
+_RANGE_PATTERN = re.compile(r"!([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?$")
+
+def parse_row_range(a1_range):
+    """Return (first_row, last_row) from an A1 range such as 'Sheet1!A12:Q14'"""
+    match = _RANGE_PATTERN.search(a1_range or '')
+    if not match:
+        return None, None
+    first_row = int(match.group(2))
+    last_row = int(match.group(4)) if match.group(4) else first_row
+    return first_row, last_row
+
+def _format_header(service):
+    requests = [{
+        'repeatCell': {
+            'range': {
+                'sheetId': 0, 'startRowIndex': 0, 'endRowIndex': 1
+            },
+            'cell': { 'userEnteredFormat': { 'textFormat': { 'bold': True }}},
+            'fields': 'userEnteredFormat(textFormat)'
+        }
+    }]
+    service.spreadsheets().batchUpdate(
+        spreadsheetId=config.SHEET_ID,
+        body={'requests': requests}
+    ).execute()
+    logger.info("Header formatted.")
+
+def write_header_if_missing(service):
+    """Write and bold HEADER_DATA when the first cell of the sheet is empty"""
+    result = service.spreadsheets().values().get(
+        spreadsheetId=config.SHEET_ID,
+        range=f'{SHEET_NAME}!A1:A1'
+    ).execute()
+
+    if result.get('values'):
+        return False
+
+    logger.info('sheet is empty, adding header')
+    service.spreadsheets().values().update(
+        spreadsheetId=config.SHEET_ID,
+        range=f'{SHEET_NAME}!A1',
+        valueInputOption='RAW',
+        body={'values': HEADER_DATA}
+    ).execute()
+    _format_header(service)
+    return True
+
+def ensure_header(service):
+    """Verify/create the header once per process so the append path can skip the read"""
+    global _header_ready
+    if _header_ready:
+        return
+
+    with _header_lock:
+        if not _header_ready:
+            write_header_if_missing(service)
+            _header_ready = True
+
+def invalidate_header_cache():
+    """Force the next append to re-check the header, e.g. after the sheet was cleared or replaced"""
+    global _header_ready
+    _header_ready = False
+
+def append_rows(service, rows: list):
+    """Append rows below the last data row in one call and return the A1 range that was written"""
+    ensure_header(service)
+
+    append_result = service.spreadsheets().values().append(
+        spreadsheetId=config.SHEET_ID,
+        range=f'{SHEET_NAME}!A1',
+        valueInputOption='RAW',
+        insertDataOption='INSERT_ROWS',
+        body={'values': rows}
+    ).execute()
+
+    return append_result.get('updates', {}).get('updatedRange')
 
 def append_data(service, new_data: list):
+    """Append rows without a read-then-write, so concurrent writers can't land on the same row"""
     try:
         if not isinstance(new_data, list):
             raise TypeError("Data passed must be of 'list' type")
 
-        range_to_check = 'Sheet1!A:A'
-        result = service.spreadsheets().values().get(
-            spreadsheetId=config.SHEET_ID,
-            range=range_to_check
-        ).execute()
-
-        existing_rows = len(result.get('values', []))
-        data_to_append = []
-        
-        if existing_rows == 0:
-            logger.info('sheet is empty, adding header')
-            data_to_append = HEADER_DATA + new_data
-            target_range = 'Sheet1!A1'
-        else:
-            data_to_append = new_data
-            start_row = existing_rows + 1
-            target_range = f'Sheet1!A{start_row}'
-
-        body = {
-            'values': data_to_append
-        }
+        # values().append picks the next free row on the server side
+        updated_range = append_rows(service, new_data)
 
-        append_result = service.spreadsheets().values().update(
-            spreadsheetId=config.SHEET_ID,
-            range=target_range,
-            valueInputOption='RAW',
-            body=body
-        ).execute()
-        
-        # Foramt header
-        if existing_rows == 0:
-            requests = [{
-                'repeatCell': {
-                    'range': {
-                        'sheetId': 0, 'startRowIndex': 0, 'endRowIndex': 1
-                    },
-                    'cell': { 'userEnteredFormat': { 'textFormat': { 'bold': True }}},
-                    'fields': 'userEnteredFormat(textFormat)'
-                }
-            }]
-            body = {'requests': requests}
-            service.spreadsheets().batchUpdate(
-                spreadsheetId=config.SHEET_ID,
-                body=body
-            ).execute()
-            logger.info("Header formatted.")
-
-        success_message = f"Successfully appended new data."
+        success_message = f"Successfully appended new data to {updated_range}."
         logger.info(success_message)
         return True, success_message
 
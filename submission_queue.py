@@ -0,0 +1,374 @@
+import os
+import re
+import json
+import time
+import uuid
+import random
+import hashlib
+import sqlite3
+import asyncio
+import logging
+import threading
+import config
+
+import drive
+import photo_store
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from googleservice import get_google_service
+from spreadsheet import ROW_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Row positions used to file the photo under its Witel / month folder
+_WITEL_COLUMN = ROW_FIELDS.index('witel')
+_TANGGAL_COLUMN = ROW_FIELDS.index('tanggal')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    row_json TEXT NOT NULL,
+    image BLOB,
+    image_name TEXT,
+    mimetype TEXT,
+    file_id TEXT,
+    image_link TEXT,
+    uploaded INTEGER NOT NULL DEFAULT 0,
+    appended INTEGER NOT NULL DEFAULT 0,
+    sheet_range TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    leased_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_due ON submissions (status, next_attempt_at);
+"""
+
+STATUS_PENDING = 'pending'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Fields that identify one visit/dealing; together with the photo digest they form the idempotency key
+KEY_FIELDS = ('kode_sa', 'tanggal', 'tenant', 'kegiatan')
+
+_CLIENT_UUID_PATTERN = re.compile(r'^[A-Za-z0-9-]{8,64}$')
+
+def submission_key(data, image_bytes=None, client_uuid=None):
+    """Idempotency key: the mini app's submission uuid when sent, else a hash of the identifying fields and photo"""
+    if client_uuid and _CLIENT_UUID_PATTERN.match(client_uuid):
+        return f"client:{client_uuid.lower()}"
+
+    digest = hashlib.sha256()
+    for field in KEY_FIELDS:
+        digest.update(str(data.get(field) or '').strip().lower().encode('utf-8'))
+        digest.update(b'\x1f')
+    if image_bytes:
+        digest.update(hashlib.sha256(image_bytes).digest())
+    return f"sha256:{digest.hexdigest()}"
+
+class SubmissionQueue:
+    """Durable local queue: submissions are written to SQLite first, then uploaded/appended by a background worker"""
+    def __init__(self, db_path=None, google_service=None, workers=None, photos=None):
+        self.db_path = db_path or config.QUEUE_DB_PATH
+        self.google_service = google_service or get_google_service()
+        self.photos = photos or photo_store.get_photo_store()
+        self.workers = workers or config.QUEUE_WORKERS
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+
+        # Bounded in-memory front of the UNIQUE idempotency_key index
+        self._key_index = OrderedDict()
+        self._key_index_lock = threading.Lock()
+
+        self._wakeup = threading.Event()
+        self._callbacks = {}  # submission id -> on_complete, in-memory only
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='submission')
+        self._in_flight = set()  # ids being processed by this process
+        self._in_flight_lock = threading.Lock()
+        self._thread = None
+        self._lease_thread = None
+        self._start_lock = threading.Lock()
+
+    # ========== PRODUCER SIDE ==========
+
+    def _remember_key(self, idempotency_key, submission_id):
+        with self._key_index_lock:
+            self._key_index[idempotency_key] = submission_id
+            self._key_index.move_to_end(idempotency_key)
+            while len(self._key_index) > config.DEDUP_CACHE_SIZE:
+                self._key_index.popitem(last=False)
+
+    def find(self, idempotency_key):
+        """Id of an earlier submission with this key, or None; checked before any Google call"""
+        with self._key_index_lock:
+            submission_id = self._key_index.get(idempotency_key)
+        if submission_id is not None:
+            return submission_id
+
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT id FROM submissions WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        self._remember_key(idempotency_key, row[0])
+        return row[0]
+
+    def enqueue(self, row: list, image_bytes, image_name, mimetype='image/jpeg', idempotency_key=None, on_complete=None):
+        """Persist a validated submission (row without the photo link); returns (id, is_duplicate)"""
+        idempotency_key = idempotency_key or uuid.uuid4().hex
+
+        existing_id = self.find(idempotency_key)
+        if existing_id is not None:
+            logger.info(f"Duplicate submission {idempotency_key} ignored (already queued as {existing_id})")
+            return existing_id, True
+
+        try:
+            with self._db_lock:
+                cursor = self._conn.execute(
+                    "INSERT INTO submissions (idempotency_key, row_json, image, image_name, mimetype, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (idempotency_key, json.dumps(row), image_bytes, image_name, mimetype, time.time())
+                )
+                submission_id = cursor.lastrowid
+        except sqlite3.IntegrityError:
+            # Lost a race with a concurrent submit of the same key
+            return self.find(idempotency_key), True
+
+        self._remember_key(idempotency_key, submission_id)
+        if on_complete:
+            self._callbacks[submission_id] = on_complete
+
+        logger.info(f"Submission {submission_id} queued ({idempotency_key})")
+        self.start()
+        self._wakeup.set()
+        return submission_id, False
+
+    async def enqueue_async(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.enqueue(*args, **kwargs))
+
+    def get(self, submission_id):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT id, idempotency_key, status, image_link, sheet_range, attempts, last_error FROM submissions WHERE id = ?",
+                (submission_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def pending_count(self):
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM submissions WHERE status = ?", (STATUS_PENDING,)).fetchone()[0]
+
+    # ========== WORKER SIDE ==========
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='submission-queue', daemon=True)
+                self._thread.start()
+                self._lease_thread = threading.Thread(target=self._renew_leases, name='submission-lease', daemon=True)
+                self._lease_thread.start()
+                logger.info(f"Submission queue worker started ({self.db_path}, {self.workers} workers)")
+
+    def _claim_due(self, limit):
+        """Lease due submissions so another process sharing the database won't pick them up too"""
+        now = time.time()
+        with self._in_flight_lock:
+            in_flight = set(self._in_flight)
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT * FROM submissions WHERE status = ? AND next_attempt_at <= ? AND leased_until <= ? "
+                "ORDER BY id LIMIT ?",
+                (STATUS_PENDING, now, now, limit)
+            ).fetchall()
+
+            claimed = []
+            for row in rows:
+                if row['id'] in in_flight:
+                    continue
+                cursor = self._conn.execute(
+                    "UPDATE submissions SET leased_until = ? WHERE id = ? AND leased_until <= ?",
+                    (now + config.QUEUE_LEASE_SECONDS, row['id'], now)
+                )
+                if cursor.rowcount:
+                    claimed.append(dict(row))
+        return claimed
+
+    def _renew_leases(self):
+        """Extend the lease of every job still running here; a job can outlive one lease while retrying Google calls"""
+        interval = config.QUEUE_LEASE_SECONDS / 3
+        while True:
+            time.sleep(interval)
+            with self._in_flight_lock:
+                ids = list(self._in_flight)
+            if not ids:
+                continue
+            placeholders = ', '.join('?' * len(ids))
+            try:
+                # leased_until = 0 means the job already recorded its outcome
+                with self._db_lock:
+                    self._conn.execute(
+                        f"UPDATE submissions SET leased_until = ? WHERE id IN ({placeholders}) AND status = ? AND leased_until > 0",
+                        (time.time() + config.QUEUE_LEASE_SECONDS, *ids, STATUS_PENDING)
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"Submission lease renewal failed: {e}")
+
+    def _next_due_in(self):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT MIN(MAX(next_attempt_at, leased_until)) FROM submissions WHERE status = ?",
+                (STATUS_PENDING,)
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+
+            with self._in_flight_lock:
+                free_slots = self.workers - len(self._in_flight)
+            if free_slots <= 0:
+                # Every slot is busy: sleep until _job_finished frees one
+                self._wakeup.wait()
+                continue
+
+            jobs = self._claim_due(free_slots)
+            for job in jobs:
+                with self._in_flight_lock:
+                    self._in_flight.add(job['id'])
+                future = self._executor.submit(self._process, job)
+                future.add_done_callback(lambda future, submission_id=job['id']: self._job_finished(submission_id, future))
+            if jobs:
+                continue
+
+            wait = self._next_due_in()
+            self._wakeup.wait(timeout=min(wait, 60.0) if wait is not None else 60.0)
+
+    def _job_finished(self, submission_id, future):
+        with self._in_flight_lock:
+            self._in_flight.discard(submission_id)
+        if future.exception():
+            logger.error(f"Submission worker error: {future.exception()}")
+        self._wakeup.set()
+
+    def _update(self, submission_id, **fields):
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        with self._db_lock:
+            self._conn.execute(f"UPDATE submissions SET {assignments} WHERE id = ?", (*fields.values(), submission_id))
+
+    def _process(self, job):
+        """Upload the photo and append the row, recording each step so a retry only redoes what failed"""
+        submission_id = job['id']
+        svc = self.google_service
+        row = json.loads(job['row_json'])
+        file_id, image_link = job['file_id'], job['image_link']
+        uploaded, appended = bool(job['uploaded']), bool(job['appended'])
+        digest = None if uploaded else photo_store.content_digest(job['image'])
+        errors = []
+
+        try:
+            if not uploaded and file_id is None:
+                # Same photo already on Drive (e.g. reused for a Visit and a later Dealing): link it, skip the upload
+                known = self.photos.lookup(digest)
+                if known:
+                    file_id, image_link = known
+                    uploaded = True
+                    self._update(submission_id, uploaded=1, file_id=file_id, image_link=image_link, image=None)
+
+            if not uploaded and file_id is None:
+                # A reserved id makes the Drive create idempotent across retries
+                file_id = svc.allocate_drive_file_id()
+                if file_id:
+                    image_link = drive.view_link(file_id)
+                    self._update(submission_id, file_id=file_id, image_link=image_link)
+
+            append_future = None
+            if not appended and image_link:
+                append_future = svc.queue_sheet_append([row + [image_link]])
+
+            if not uploaded:
+                folder_id = svc.drive_folder(row[_WITEL_COLUMN], row[_TANGGAL_COLUMN])
+                link = svc.upload_to_drive(BytesIO(job['image']), job['image_name'], job['mimetype'], file_id, folder_id)
+                if link:
+                    uploaded = True
+                    image_link = image_link or link
+                    self._update(submission_id, uploaded=1, image_link=image_link, image=None)
+                    self.photos.remember(digest, file_id, image_link)
+                else:
+                    errors.append("upload ke Google Drive gagal")
+
+            if not appended and append_future is None and image_link:
+                append_future = svc.queue_sheet_append([row + [image_link]])
+
+            if append_future is not None:
+                status, msg = append_future.result()
+                if status:
+                    appended = True
+                    self._update(submission_id, appended=1, sheet_range=msg)
+                else:
+                    errors.append(msg)
+
+        except Exception as e:
+            errors.append(str(e))
+
+        if uploaded and appended:
+            self._update(submission_id, status=STATUS_DONE, leased_until=0, last_error=None)
+            logger.info(f"Submission {submission_id} saved: {image_link}")
+            self._notify(submission_id, True)
+            return
+
+        attempts = job['attempts'] + 1
+        error_msg = '; '.join(errors)
+        if attempts >= config.QUEUE_MAX_ATTEMPTS:
+            self._update(submission_id, status=STATUS_FAILED, attempts=attempts, leased_until=0, last_error=error_msg)
+            logger.error(f"Submission {submission_id} gave up after {attempts} attempts: {error_msg}")
+            self._notify(submission_id, False)
+            return
+
+        # Exponential backoff with full jitter
+        delay = random.uniform(0, min(config.QUEUE_RETRY_MAX_SECONDS, config.QUEUE_RETRY_BASE_SECONDS * 2 ** attempts))
+        self._update(submission_id, attempts=attempts, next_attempt_at=time.time() + delay, leased_until=0, last_error=error_msg)
+        logger.warning(f"Submission {submission_id} attempt {attempts} failed, retrying in {delay:.0f}s: {error_msg}")
+
+    def _notify(self, submission_id, success):
+        callback = self._callbacks.pop(submission_id, None)
+        if callback is None:
+            return
+        try:
+            callback(self.get(submission_id), success)
+        except Exception as e:
+            logger.error(f"Submission {submission_id} callback failed: {e}")
+
+
+_submission_queue = None
+_submission_queue_lock = threading.Lock()
+
+def get_submission_queue():
+    """Return the process-wide SubmissionQueue; its worker also resumes submissions left from a previous run"""
+    global _submission_queue
+    if _submission_queue is None:
+        with _submission_queue_lock:
+            if _submission_queue is None:
+                _submission_queue = SubmissionQueue()
+                _submission_queue.start()
+    return _submission_queue
@@ -0,0 +1,247 @@
+import time
+import asyncio
+import logging
+import threading
+
+import rate_limit
+import image_processing
+from collections import namedtuple
+from spreadsheet import ROW_FIELDS
+from submission_queue import get_submission_queue, submission_key, STATUS_PENDING, STATUS_DONE
+from form_schema import validate_form
+from visit_record import VisitRecord
+
+logger = logging.getLogger(__name__)
+
+# completion is an asyncio Future resolving to (submission, success); only set by submit_async
+SubmissionResult = namedtuple(
+    'SubmissionResult', ['submission_id', 'duplicate', 'row', 'errors', 'completion'],
+    defaults=(None, False, None, (), None)
+)
+
+# Everything but the photo link, which the queue worker appends after the upload
+DATA_FIELDS = ROW_FIELDS[:-1]
+
+# Never returned by the HTTP APIs: a client:<uuid> key is the secret find_reference checks
+PRIVATE_SUBMISSION_FIELDS = ('idempotency_key',)
+
+def public_submission(submission):
+    """A queued submission as /api/submissions/<id> may show it to anyone"""
+    return {key: value for key, value in submission.items() if key not in PRIVATE_SUBMISSION_FIELDS}
+
+class SubmissionMetrics:
+    """Thread-safe counters and average stage timings for the submission pipeline"""
+    COUNTERS = ('received', 'rejected', 'duplicates', 'queued', 'saved', 'failed')
+    TIMINGS = ('normalize', 'enqueue', 'end_to_end')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.COUNTERS, 0)
+        self._totals = dict.fromkeys(self.TIMINGS, 0.0)
+        self._samples = dict.fromkeys(self.TIMINGS, 0)
+
+    def count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def timing(self, name, seconds):
+        with self._lock:
+            self._totals[name] += seconds
+            self._samples[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self._counts)
+            for name in self.TIMINGS:
+                samples = self._samples[name]
+                snapshot[f"{name}_ms_avg"] = round(self._totals[name] * 1000 / samples, 1) if samples else None
+        return snapshot
+
+class SubmissionService:
+    """One pipeline for every entry point: validate, dedup, normalise the photo, build the row and queue it"""
+    def __init__(self, submission_queue=None):
+        self.queue = submission_queue or get_submission_queue()
+        self.metrics = SubmissionMetrics()
+
+    # ========== ROW LAYOUT ==========
+
+    @staticmethod
+    def build_row(data, image_link=None):
+        """Row in HEADER_DATA order; empty or missing fields become '-'. The photo link (17) is added only when given"""
+        if isinstance(data, VisitRecord):
+            return data.to_row(image_link)
+        row = [data.get(field) or '-' for field in DATA_FIELDS]
+        if image_link is not None:
+            row.append(image_link)
+        return row
+
+    @staticmethod
+    def image_name(data, mimetype='image/jpeg'):
+        kode_sa_string = str(data.get('kode_sa') or 'unknown').replace('/', '_')
+        tanggal_string = str(data.get('tanggal') or 'nodate').replace('/', '_')
+        kegiatan_string = data.get('kegiatan') or 'data'
+        return f"{kode_sa_string}_{tanggal_string}_{kegiatan_string}.{image_processing.extension_for(mimetype)}"
+
+    # ========== VALIDATION ==========
+
+    @staticmethod
+    def validate(data):
+        """Return a list of error messages (empty when valid) for a complete visit/dealing record"""
+        return validate_form(data)[0]
+
+    @staticmethod
+    def clean(data):
+        """(errors, normalised values) for a complete visit/dealing record, see form_schema.validate_form"""
+        return validate_form(data)
+
+    # ========== PIPELINE ==========
+
+    def _check(self, data, image_bytes, client_uuid, validate):
+        """Validation; returns (rejection or None, idempotency key, data to store)"""
+        self.metrics.count('received')
+
+        if validate:
+            errors, values = validate_form(data)
+            if errors:
+                self.metrics.count('rejected')
+                return SubmissionResult(errors=errors), None, data
+            # Store the cleaned values (title case names, normalised dates and phone numbers)
+            data = {**data, **values}
+
+        return None, submission_key(data, image_bytes, client_uuid), data
+
+    def _duplicate_of(self, existing_id):
+        """Double-taps and resubmits of the same form are answered without any upload"""
+        if existing_id is None:
+            return None
+        self.metrics.count('duplicates')
+        return SubmissionResult(existing_id, True)
+
+    def _completion_callback(self, forward=None):
+        """Queue worker callback: records the outcome, then hands it to forward(submission, success)"""
+        enqueued_at = time.perf_counter()
+
+        def on_complete(submission, success):
+            self.metrics.count('saved' if success else 'failed')
+            self.metrics.timing('end_to_end', time.perf_counter() - enqueued_at)
+            if forward is not None:
+                forward(submission, success)
+
+        return on_complete
+
+    def _queued(self, submission_id, duplicate, row, completion=None):
+        self.metrics.count('duplicates' if duplicate else 'queued')
+        if duplicate:
+            return SubmissionResult(submission_id, True)
+        logger.info(f"Submission {submission_id} queued: {row}")
+        return SubmissionResult(submission_id, False, row, completion=completion)
+
+    def submit(self, data, image_bytes, client_uuid=None, validate=True, on_complete=None):
+        """Blocking variant for WSGI/worker threads; on_complete(submission, success) runs on the queue worker.
+
+        Invalid data is not queued: result.errors lists the messages. Pass validate=False only for data
+        that already went through clean().
+        """
+        result, idempotency_key, data = self._check(data, image_bytes, client_uuid, validate)
+        if result is None:
+            result = self._duplicate_of(self.queue.find(idempotency_key))
+        if result is not None:
+            return result
+
+        started = time.perf_counter()
+        image_bytes, mimetype = image_processing.submit_normalize(image_bytes).result()
+        self.metrics.timing('normalize', time.perf_counter() - started)
+
+        row = self.build_row(data)
+
+        # Persisted locally; Drive upload (17) and sheet append happen on the queue worker
+        started = time.perf_counter()
+        submission_id, duplicate = self.queue.enqueue(
+            row, image_bytes, self.image_name(data, mimetype), mimetype,
+            idempotency_key=idempotency_key, on_complete=self._completion_callback(on_complete)
+        )
+        self.metrics.timing('enqueue', time.perf_counter() - started)
+
+        return self._queued(submission_id, duplicate, row)
+
+    async def submit_async(self, data, image_bytes, client_uuid=None, validate=True):
+        """Event-loop variant; result.completion resolves to (submission, success) once the worker is done"""
+        result, idempotency_key, data = self._check(data, image_bytes, client_uuid, validate)
+        if result is None:
+            # On an LRU miss find() queries SQLite; keep it off the event loop
+            result = self._duplicate_of(await asyncio.to_thread(self.queue.find, idempotency_key))
+        if result is not None:
+            return result
+
+        started = time.perf_counter()
+        image_bytes, mimetype = await image_processing.normalize_image_async(image_bytes)
+        self.metrics.timing('normalize', time.perf_counter() - started)
+
+        row = self.build_row(data)
+
+        loop = asyncio.get_running_loop()
+        completion = loop.create_future()
+
+        def resolve(submission, success):
+            def set_result():
+                if not completion.done():
+                    completion.set_result((submission, success))
+            loop.call_soon_threadsafe(set_result)
+
+        started = time.perf_counter()
+        submission_id, duplicate = await self.queue.enqueue_async(
+            row, image_bytes, self.image_name(data, mimetype), mimetype,
+            idempotency_key=idempotency_key, on_complete=self._completion_callback(resolve)
+        )
+        self.metrics.timing('enqueue', time.perf_counter() - started)
+
+        return self._queued(submission_id, duplicate, row, completion)
+
+    # ========== REFERENCES ==========
+
+    def find_reference(self, submission_id, client_uuid):
+        """Queued submission for a mini app reference; only found with the uuid it was uploaded with"""
+        if not client_uuid:
+            return None
+        submission = self.queue.get(submission_id)
+        if submission is None or submission['idempotency_key'] != submission_key({}, None, client_uuid):
+            return None
+        return submission
+
+    async def wait_async(self, submission_id, poll_seconds=1.0, timeout=600):
+        """(submission, success) once the worker is done; success is None if still pending after timeout.
+
+        Polls the queue database, so it also follows submissions queued by another worker process.
+        A submission that is not in the queue (unknown id, or purged) returns (None, False).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            submission = await asyncio.to_thread(self.queue.get, submission_id)
+            if submission is None:
+                logger.warning(f"Submission {submission_id} not found in the queue")
+                return None, False
+            if submission['status'] != STATUS_PENDING:
+                return submission, submission['status'] == STATUS_DONE
+            if loop.time() >= deadline:
+                return submission, None
+            await asyncio.sleep(poll_seconds)
+
+    def stats(self):
+        stats = self.metrics.snapshot()
+        stats['pending'] = self.queue.pending_count()
+        stats['google'] = rate_limit.stats()
+        return stats
+
+
+_submission_service = None
+_submission_service_lock = threading.Lock()
+
+def get_submission_service():
+    """Return the process-wide SubmissionService shared by the bot handlers and the HTTP APIs"""
+    global _submission_service
+    if _submission_service is None:
+        with _submission_service_lock:
+            if _submission_service is None:
+                _submission_service = SubmissionService()
+    return _submission_service
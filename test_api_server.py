@@ -1,6 +1,8 @@
 from flask import Flask, request, jsonify, current_app, send_from_directory, abort
 import os, tempfile, time, uuid
-from googleservice import GoogleService
+from googleservice import get_google_service
+from submission_queue import SubmissionQueue
+from submission_service import SubmissionService, get_submission_service, public_submission
 import json
 
 def _files_summary(files):
@@ -41,9 +43,11 @@ def log_request_summary():
 def create_app():
     app = Flask(__name__, static_folder="webapp", static_url_path="")
 
-    # Create one GoogleService instance per process and store as an extension:
+    # Share the process-wide GoogleService (clients are built once, lazily) and submission queue:
     app.extensions = getattr(app, "extensions", {})
-    app.extensions["google_service"] = GoogleService()
+    app.extensions["google_service"] = get_google_service()
+    app.extensions["submission_service"] = get_submission_service()
+    app.extensions["submission_queue"] = app.extensions["submission_service"].queue
 
     @app.get("/")
     def index():
@@ -68,48 +72,39 @@ def create_app():
             return jsonify({"error":"file too large"}), 413
         
         form_dict = request.form.to_dict(flat=True)
-        for key, value in form_dict.items():
-            if value == '':
-                form_dict[key] = '-'
 
-        image_file = foto_evidence.stream
-        image_file.seek(0)
+        foto_evidence.stream.seek(0)
+        image_bytes = foto_evidence.stream.read()
 
-        svc: GoogleService = current_app.extensions["google_service"]
-        svc.authenticate()
-        svc.build_services()
+        service: SubmissionService = current_app.extensions["submission_service"]
 
+        # Retries from the mini app carry the same submission_uuid; answered without re-uploading
         try:
-            drive_link = svc.upload_to_drive(image_file, f"{form_dict.get('kode_sa')}_{form_dict.get('tanggal')}_{form_dict.get('kegiatan')}.jpg")
-            form_dict['foto_evidence'] = drive_link
-            
-            # TODO: change foto evidence file type to match with what telegram bot does, change empty fields to `-` in the javascript front end
-            row = [
-                form_dict.get('kode_sa', '-'),      # 1
-                form_dict.get('nama', '-'),         # 2
-                form_dict.get('no_telp', '-'),      # 3
-                form_dict.get('witel', '-'),        # 4
-                form_dict.get('telda', '-'),        # 5
-                form_dict.get('tanggal', '-'),      # 6
-                form_dict.get('kategori', '-'),     # 7
-                form_dict.get('tenant', '-'),       # 8
-                form_dict.get('kegiatan', '-'),     # 9
-                form_dict.get('layanan', '-'),      # 10
-                form_dict.get('tarif', '-'),        # 11
-                form_dict.get('nama_pic', '-'),     # 12
-                form_dict.get('jabatan_pic', '-'),  # 13
-                form_dict.get('telepon_pic', '-'),  # 14
-                form_dict.get('paket_deal', '-'),   # 15
-                form_dict.get('deal_bundling', '-'), # 16
-                form_dict.get('foto_evidence', '-'), # 17
-            ]
-
-            success, res = svc.append_to_sheet([row])
-
-            return jsonify({"row": row, "status": success})
-    
+            result = service.submit(form_dict, image_bytes, form_dict.pop('submission_uuid', None))
         except Exception as e:
-            current_app.logger.info(f'Error ocurred on google service process: {e}')
+            current_app.logger.error(f'Error ocurred while queueing submission: {e}')
+            return jsonify({"error": "could not queue submission"}), 500
+
+        if result.errors:
+            return jsonify({"error": "validation failed", "errors": list(result.errors)}), 400
+
+        if result.duplicate:
+            return jsonify({"status": True, "duplicate": True, "submission_id": result.submission_id}), 200
+
+        return jsonify({"row": result.row, "status": True, "queued": True, "submission_id": result.submission_id}), 202
+
+    @app.get("/api/submissions/<int:submission_id>")
+    def submission_status(submission_id: int):
+        queue: SubmissionQueue = current_app.extensions["submission_queue"]
+        submission = queue.get(submission_id)
+        if not submission:
+            abort(404)
+        return jsonify(public_submission(submission))
+
+    @app.get("/api/metrics")
+    def submission_metrics():
+        service: SubmissionService = current_app.extensions["submission_service"]
+        return jsonify(service.stats())
 
     return app
 
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import config
+
+logger = logging.getLogger(__name__)
+
+class UploadError(Exception):
+    """Rejected chunk or finalize; status is the HTTP code the API answers with"""
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+class UploadSpool:
+    """Partial photo uploads on disk: <id>.part holds the bytes received so far, <id>.json the declared size.
+
+    The byte offset of an upload is the size of its .part file, so a client that lost its connection
+    asks for the offset and continues from there. Only one chunk is held in memory per request.
+    """
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or config.UPLOAD_SPOOL_DIR
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        # Per-upload locks so two retries of the same chunk can't interleave their writes
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _path(self, upload_id, suffix):
+        # Ids are generated here as uuid4 hex; anything else is rejected before touching the filesystem
+        try:
+            upload_id = uuid.UUID(hex=upload_id).hex
+        except (TypeError, ValueError):
+            raise UploadError("unknown upload", 404)
+        return os.path.join(self.directory, f"{upload_id}{suffix}")
+
+    def _lock(self, upload_id):
+        with self._locks_lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def create(self, size, filename=None, mimetype=None):
+        if size <= 0 or (self.max_bytes and size > self.max_bytes):
+            raise UploadError("file too large" if size > 0 else "size required", 413 if size > 0 else 400)
+
+        upload_id = uuid.uuid4().hex
+        with open(self._path(upload_id, '.json'), 'w', encoding='utf-8') as f:
+            json.dump({'size': size, 'filename': filename, 'mimetype': mimetype, 'created_at': time.time()}, f)
+        open(self._path(upload_id, '.part'), 'wb').close()
+        logger.info(f"Upload {upload_id} started ({size} bytes)")
+        return upload_id
+
+    def info(self, upload_id):
+        """Declared metadata plus the current offset"""
+        try:
+            with open(self._path(upload_id, '.json'), encoding='utf-8') as f:
+                info = json.load(f)
+            info['offset'] = os.path.getsize(self._path(upload_id, '.part'))
+        except FileNotFoundError:
+            raise UploadError("unknown upload", 404)
+        return info
+
+    def write(self, upload_id, offset, chunk):
+        """Write chunk at offset; returns the new offset. A mismatched offset is a 409 carrying the current one"""
+        with self._lock(upload_id):
+            info = self.info(upload_id)
+            if offset != info['offset']:
+                raise UploadError("offset mismatch", 409, info['offset'])
+            if offset + len(chunk) > info['size']:
+                raise UploadError("chunk exceeds declared size", 400, info['offset'])
+
+            # Positional write: a retry of the same chunk racing in another worker process rewrites the same bytes
+            with open(self._path(upload_id, '.part'), 'r+b') as f:
+                f.seek(offset)
+                f.write(chunk)
+            return offset + len(chunk)
+
+    def read_complete(self, upload_id):
+        """(bytes, info) of a fully received upload"""
+        with self._lock(upload_id):
+            info = self.info(upload_id)
+            if info['offset'] != info['size']:
+                raise UploadError("upload incomplete", 409, info['offset'])
+            with open(self._path(upload_id, '.part'), 'rb') as f:
+                return f.read(), info
+
+    def discard(self, upload_id):
+        for suffix in ('.part', '.json'):
+            try:
+                os.remove(self._path(upload_id, suffix))
+            except FileNotFoundError:
+                pass
+        with self._locks_lock:
+            self._locks.pop(upload_id, None)
+
+    def purge(self, max_age=None):
+        """Remove unfinished uploads that received no chunk for max_age seconds"""
+        cutoff = time.time() - (max_age if max_age is not None else config.UPLOAD_SPOOL_TTL_SECONDS)
+        removed = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-len('.json')]
+            try:
+                try:
+                    modified = os.path.getmtime(self._path(upload_id, '.part'))
+                except FileNotFoundError:
+                    # Metadata left behind without its .part (e.g. an interrupted discard) ages from its own mtime
+                    modified = os.path.getmtime(os.path.join(self.directory, name))
+                if modified < cutoff:
+                    self.discard(upload_id)
+                    removed += 1
+            except (FileNotFoundError, UploadError):
+                pass
+        if removed:
+            logger.info(f"Purged {removed} abandoned uploads")
+        return removed
@@ -4,6 +4,75 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Compiled once at import; validators run for every step and every submitted form
+NAMA_PATTERN = re.compile(r"^[a-zA-Z\s\.']+$")           # letters, spaces, dots, apostrophes
+TEXT_PATTERN = re.compile(r"^[a-zA-Z\s\.\-]+$")          # telda / tenant: plus hyphens
+JABATAN_PATTERN = re.compile(r"^[a-zA-Z\s\.\-\(\)]+$")  # job titles: plus parentheses
+NON_DIGIT_PATTERN = re.compile(r'\D')
+
+# Indonesian mobile numbers: 08xx (not 080x), 628xx or +628xx
+PHONE_PATTERN = re.compile(r'^(?:08[1-9]\d{7,10}|628[1-9]\d{7,10}|\+628[1-9]\d{7,10})$')
+
+DATE_PATTERNS = (
+    re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})$'),     # DD/MM/YYYY
+    re.compile(r'^(\d{1,2})-(\d{1,2})-(\d{4})$'),     # DD-MM-YYYY
+    re.compile(r'^(\d{1,2})\s+(\d{1,2})\s+(\d{4})$'), # DD MM YYYY (satu atau lebih spasi)
+)
+ISO_DATE_PATTERN = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')  # YYYY-MM-DD, sent by the mini app's date input
+
+# Option lists keep display order for error messages; lookups go through frozensets/dicts
+WITEL_OPTIONS = (
+    'Bali', 'Jatim Barat', 'Jatim Timur', 'Nusa Tenggara',
+    'Semarang Jateng', 'Solo Jateng Timur', 'Suramadu', 'Yogya Jateng Selatan'
+)
+KATEGORI_OPTIONS = ('Kawasan Industri', 'Desa', 'Puskesmas', 'Kecamatan')
+KEGIATAN_OPTIONS = ('Visit', 'Dealing')
+LAYANAN_OPTIONS = ('Indihome', 'Indibiz', 'Kompetitor')
+PAKET_OPTIONS = ('50 Mbps', '75 Mbps', '100 Mbps', '> 100 Mbps')
+TARIF_OPTIONS = ('< Rp 200.000', 'Rp 200.000 - Rp 350.000', '> Rp 500.000')
+BUNDLING_OPTIONS = (
+    '1P Internet Only',
+    '2P Internet + TV',
+    '2P Internet + Telepon',
+    '3P Internet + TV + Telepon'
+)
+
+WITEL_SET = frozenset(WITEL_OPTIONS)
+TARIF_SET = frozenset(TARIF_OPTIONS)
+BUNDLING_SET = frozenset(BUNDLING_OPTIONS)
+
+def _case_insensitive(options):
+    return {option.lower(): option for option in options}
+
+KATEGORI_LOOKUP = _case_insensitive(KATEGORI_OPTIONS)
+KEGIATAN_LOOKUP = _case_insensitive(KEGIATAN_OPTIONS)
+LAYANAN_LOOKUP = _case_insensitive(LAYANAN_OPTIONS)
+PAKET_LOOKUP = _case_insensitive(PAKET_OPTIONS)
+
+def normalize_phone(phone):
+    """Return the accepted form of an Indonesian mobile number, or None when it is not valid"""
+    original = phone.strip()
+
+    # Check original format first (dengan spasi dan dash dihilangkan)
+    if PHONE_PATTERN.match(original.replace(' ', '').replace('-', '')):
+        return original
+
+    # Auto-format hanya jika nomor dimulai dengan digit yang valid untuk Indonesia
+    clean_phone = NON_DIGIT_PATTERN.sub('', phone)
+    if len(clean_phone) >= 10:
+        # Jika dimulai dengan 8, tambahkan 0 di depan (misal: 81234567890 -> 081234567890)
+        if clean_phone[0] == '8' and clean_phone[1] in '123456789':
+            formatted = '0' + clean_phone
+            if PHONE_PATTERN.match(formatted):
+                return formatted
+
+        # Jika sudah dimulai dengan 08, 628, cek apakah valid
+        elif clean_phone.startswith(('08', '628')):
+            if PHONE_PATTERN.match(clean_phone):
+                return clean_phone
+
+    return None
+
 class DataValidator:
     """Complete validator untuk setiap step input dengan semua method yang diperlukan"""
     
@@ -15,7 +84,8 @@ class DataValidator:
             
         kode = kode.strip().upper()
         
-        logger.info(f"Kode SA validated: {kode}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Kode SA validated: {kode}")
         return True, kode  # Return cleaned version
     
     @staticmethod
@@ -33,10 +103,11 @@ class DataValidator:
             return False, "Nama terlalu panjang (maksimal 50 karakter)"
         
         # Only letters, spaces, dots, and apostrophes
-        if not re.match(r"^[a-zA-Z\s\.']+$", nama):
+        if not NAMA_PATTERN.match(nama):
             return False, "Nama hanya boleh mengandung huruf, spasi, titik, dan tanda petik"
         
-        logger.info(f"Nama validated: {nama}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Nama validated: {nama}")
         return True, nama
     
     @staticmethod
@@ -45,43 +116,13 @@ class DataValidator:
         if not telepon:
             return False, "Nomor telepon tidak boleh kosong"
         
-        # Remove all non-digits first untuk checking
-        clean_phone = re.sub(r'\D', '', telepon)
-        original = telepon.strip()
-        
-        # Indonesian phone patterns dengan prefix yang valid
-        patterns = [
-            r'^08[1-9]\d{7,10}$',      # 08xx format (081x, 082x, dst - bukan 080x)
-            r'^628[1-9]\d{7,10}$',     # 628xx format  
-            r'^\+628[1-9]\d{7,10}$'    # +628xx format
-        ]
-        
-        # Check original format first (dengan spasi dan dash dihilangkan)
-        clean_original = original.replace(' ', '').replace('-', '')
-        for pattern in patterns:
-            if re.match(pattern, clean_original):
-                logger.info(f"Phone validated (original format): {original}")
-                return True, original
-        
-        # Auto-format hanya jika nomor dimulai dengan digit yang valid untuk Indonesia
-        if len(clean_phone) >= 10:
-            # Jika dimulai dengan 8, tambahkan 0 di depan (misal: 81234567890 -> 081234567890)
-            if clean_phone.startswith('8') and clean_phone[1] in '123456789':
-                formatted = '0' + clean_phone
-                # Validasi ulang dengan pattern
-                for pattern in patterns:
-                    if re.match(pattern, formatted):
-                        logger.info(f"Phone validated (auto-formatted): {formatted}")
-                        return True, formatted
-            
-            # Jika sudah dimulai dengan 08, 628, cek apakah valid
-            elif clean_phone.startswith('08') or clean_phone.startswith('628'):
-                for pattern in patterns:
-                    if re.match(pattern, clean_phone):
-                        logger.info(f"Phone validated (clean): {clean_phone}")
-                        return True, clean_phone
-        
-        return False, "Format nomor telepon tidak valid. Contoh: 081234567890, +6281234567890"
+        phone = normalize_phone(telepon)
+        if phone is None:
+            return False, "Format nomor telepon tidak valid. Contoh: 081234567890, +6281234567890"
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Phone validated: {phone}")
+        return True, phone
     
     @staticmethod
     def validate_witel(witel):
@@ -91,16 +132,12 @@ class DataValidator:
             
         witel = witel.strip()
         
-        valid_witels = [
-            'Bali', 'Jatim Barat', 'Jatim Timur', 'Nusa Tenggara',
-            'Semarang Jateng', 'Solo Jateng Timur', 'Suramadu', 'Yogya Jateng Selatan'
-        ]
-        
-        if witel in valid_witels:
-            logger.info(f"Witel validated: {witel}")
+        if witel in WITEL_SET:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Witel validated: {witel}")
             return True, witel
         
-        return False, f"Witel tidak valid. Pilihan: {', '.join(valid_witels)}"
+        return False, f"Witel tidak valid. Pilihan: {', '.join(WITEL_OPTIONS)}"
     
     @staticmethod
     def validate_telda(telda):
@@ -117,37 +154,36 @@ class DataValidator:
             return False, "Nama Telkom Daerah terlalu panjang (maksimal 50 karakter)"
         
         # Allow letters, spaces, and some common characters
-        if not re.match(r"^[a-zA-Z\s\.\-]+$", telda):
+        if not TEXT_PATTERN.match(telda):
             return False, "Telkom Daerah hanya boleh mengandung huruf, spasi, titik, dan tanda hubung"
         
-        logger.info(f"Telda validated: {telda}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Telda validated: {telda}")
         return True, telda
     
     @staticmethod
     def validate_tanggal(tanggal):
-        """Validasi Tanggal dengan format DD/MM/YYYY, DD-MM-YYYY, atau DD MM YYYY"""
+        """Validasi Tanggal dengan format DD/MM/YYYY, DD-MM-YYYY, DD MM YYYY, atau YYYY-MM-DD (mini app)"""
         if not tanggal:
             return False, "Tanggal tidak boleh kosong"
             
         tanggal = tanggal.strip()
         
-        # Multiple date patterns
-        date_patterns = [
-            r'^(\d{1,2})/(\d{1,2})/(\d{4})$',    # DD/MM/YYYY
-            r'^(\d{1,2})-(\d{1,2})-(\d{4})$',    # DD-MM-YYYY  
-            r'^(\d{1,2})\s+(\d{1,2})\s+(\d{4})$' # DD MM YYYY (satu atau lebih spasi)
-        ]
-        
         day = month = year = None
         matched_format = None
         
         # Try each pattern
-        for i, pattern in enumerate(date_patterns):
-            match = re.match(pattern, tanggal)
+        for i, pattern in enumerate(DATE_PATTERNS):
+            match = pattern.match(tanggal)
             if match:
                 day, month, year = map(int, match.groups())
                 matched_format = ['DD/MM/YYYY', 'DD-MM-YYYY', 'DD MM YYYY'][i]
                 break
+        else:
+            match = ISO_DATE_PATTERN.match(tanggal)
+            if match:
+                year, month, day = map(int, match.groups())
+                matched_format = 'YYYY-MM-DD'
         
         if not matched_format:
             return False, "Format tanggal tidak valid. Gunakan format DD/MM/YYYY, DD-MM-YYYY, atau DD MM YYYY (contoh: 15/08/2025, 15-08-2025, 15 08 2025)"
@@ -164,7 +200,8 @@ class DataValidator:
             # Normalize to DD/MM/YYYY format untuk konsistensi output
             normalized_date = f"{day:02d}-{month:02d}-{year}"
             
-            logger.info(f"Tanggal validated: {tanggal} -> normalized: {normalized_date}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Tanggal validated: {tanggal} -> normalized: {normalized_date}")
             return True, normalized_date
             
         except ValueError as e:
@@ -176,27 +213,14 @@ class DataValidator:
         if not kategori or not kategori.strip():
             return False, "Kategori tidak boleh kosong"
         
-        kategori = kategori.strip()
-        
-        valid_categories = [
-            'Kawasan Industri',
-            'Desa', 
-            'Puskesmas',
-            'Kecamatan'
-        ]
-        
-        if kategori in valid_categories:
-            logger.info(f"Kategori validated: {kategori}")
-            return True, kategori
+        # Exact or case-insensitive match against the canonical option
+        matched = KATEGORI_LOOKUP.get(kategori.strip().lower())
+        if matched is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Kategori validated: {matched}")
+            return True, matched
         
-        # Case insensitive fallback
-        kategori_lower = kategori.lower()
-        for cat in valid_categories:
-            if cat.lower() == kategori_lower:
-                logger.info(f"Kategori validated (case corrected): {cat}")
-                return True, cat
-        
-        return False, f"Kategori tidak valid. Pilihan: {', '.join(valid_categories)}"
+        return False, f"Kategori tidak valid. Pilihan: {', '.join(KATEGORI_OPTIONS)}"
     
     @staticmethod
     def validate_kegiatan(kegiatan):
@@ -204,22 +228,14 @@ class DataValidator:
         if not kegiatan or not kegiatan.strip():
             return False, "Kegiatan tidak boleh kosong"
         
-        kegiatan = kegiatan.strip()
-        
-        valid_kegiatan = ['Visit', 'Dealing']
+        # Exact or case-insensitive match against the canonical option
+        matched = KEGIATAN_LOOKUP.get(kegiatan.strip().lower())
+        if matched is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Kegiatan validated: {matched}")
+            return True, matched
         
-        if kegiatan in valid_kegiatan:
-            logger.info(f"Kegiatan validated: {kegiatan}")
-            return True, kegiatan
-        
-        # Case insensitive fallback
-        kegiatan_lower = kegiatan.lower()
-        for keg in valid_kegiatan:
-            if keg.lower() == kegiatan_lower:
-                logger.info(f"Kegiatan validated (case corrected): {keg}")
-                return True, keg
-        
-        return False, f"Kegiatan tidak valid. Pilihan: {', '.join(valid_kegiatan)}"
+        return False, f"Kegiatan tidak valid. Pilihan: {', '.join(KEGIATAN_OPTIONS)}"
     
     @staticmethod
     def validate_tenant(tenant):
@@ -236,10 +252,11 @@ class DataValidator:
             return False, "Nama Tenant terlalu panjang (maksimal 50 karakter)"
         
         # Allow letters, spaces, and some common characters
-        if not re.match(r"^[a-zA-Z\s\.\-]+$", tenant):
+        if not TEXT_PATTERN.match(tenant):
             return False, "Tenant hanya boleh mengandung huruf, spasi, titik, dan tanda hubung"
         
-        logger.info(f"Tenant validated: {tenant}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Tenant validated: {tenant}")
         return True, tenant
     
     @staticmethod
@@ -248,22 +265,14 @@ class DataValidator:
         if not layanan or not layanan.strip():
             return False, "Tipe Layanan tidak boleh kosong"
         
-        layanan = layanan.strip()
-        
-        valid_layanan = ['Indihome', 'Indibiz', 'Kompetitor']
-        
-        if layanan in valid_layanan:
-            logger.info(f"Layanan validated: {layanan}")
-            return True, layanan
-        
-        # Case insensitive fallback
-        layanan_lower = layanan.lower()
-        for lay in valid_layanan:
-            if lay.lower() == layanan_lower:
-                logger.info(f"Layanan validated (case corrected): {lay}")
-                return True, lay
+        # Exact or case-insensitive match against the canonical option
+        matched = LAYANAN_LOOKUP.get(layanan.strip().lower())
+        if matched is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Layanan validated: {matched}")
+            return True, matched
         
-        return False, f"Tipe Layanan tidak valid. Pilihan: {', '.join(valid_layanan)}"
+        return False, f"Tipe Layanan tidak valid. Pilihan: {', '.join(LAYANAN_OPTIONS)}"
     
     @staticmethod
     def validate_paket(paket):
@@ -271,22 +280,14 @@ class DataValidator:
         if not paket or not paket.strip():
             return False, "Paket Dealing tidak boleh kosong"
         
-        paket = paket.strip()
+        # Exact or case-insensitive match against the canonical option
+        matched = PAKET_LOOKUP.get(paket.strip().lower())
+        if matched is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Paket validated: {matched}")
+            return True, matched
         
-        valid_paket = ['50 Mbps', '75 Mbps', '100 Mbps', '> 100 Mbps']
-        
-        if paket in valid_paket:
-            logger.info(f"Paket validated: {paket}")
-            return True, paket
-        
-        # Case insensitive fallback
-        paket_lower = paket.lower()
-        for pak in valid_paket:
-            if pak.lower() == paket_lower:
-                logger.info(f"Paket validated (case corrected): {pak}")
-                return True, pak
-        
-        return False, f"Paket Dealing tidak valid. Pilihan: {', '.join(valid_paket)}"
+        return False, f"Paket Dealing tidak valid. Pilihan: {', '.join(PAKET_OPTIONS)}"
     
     @staticmethod
     def validate_tarif(tarif):
@@ -296,17 +297,12 @@ class DataValidator:
         
         tarif = tarif.strip()
         
-        valid_tarif = [
-            '< Rp 200.000',
-            'Rp 200.000 - Rp 350.000',
-            '> Rp 500.000'
-        ]
-        
-        if tarif in valid_tarif:
-            logger.info(f"Tarif validated: {tarif}")
+        if tarif in TARIF_SET:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Tarif validated: {tarif}")
             return True, tarif
         
-        return False, f"Tarif Layanan tidak valid. Pilihan: {', '.join(valid_tarif)}"
+        return False, f"Tarif Layanan tidak valid. Pilihan: {', '.join(TARIF_OPTIONS)}"
     
     @staticmethod
     def validate_nama_pic(nama_pic):
@@ -323,10 +319,11 @@ class DataValidator:
             return False, "Nama PIC terlalu panjang (maksimal 50 karakter)"
         
         # Only letters, spaces, dots, and apostrophes
-        if not re.match(r"^[a-zA-Z\s\.']+$", nama_pic):
+        if not NAMA_PATTERN.match(nama_pic):
             return False, "Nama PIC hanya boleh mengandung huruf, spasi, titik, dan tanda petik"
         
-        logger.info(f"Nama PIC validated: {nama_pic}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Nama PIC validated: {nama_pic}")
         return True, nama_pic
     
     @staticmethod
@@ -344,10 +341,11 @@ class DataValidator:
             return False, "Jabatan PIC terlalu panjang (maksimal 50 karakter)"
         
         # Allow letters, spaces, dots, hyphens, and parentheses for job titles
-        if not re.match(r"^[a-zA-Z\s\.\-\(\)]+$", jabatan_pic):
+        if not JABATAN_PATTERN.match(jabatan_pic):
             return False, "Jabatan PIC hanya boleh mengandung huruf, spasi, titik, tanda hubung, dan kurung"
         
-        logger.info(f"Jabatan PIC validated: {jabatan_pic}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Jabatan PIC validated: {jabatan_pic}")
         return True, jabatan_pic
     
     @staticmethod
@@ -355,44 +353,14 @@ class DataValidator:
         """Validasi Nomor HP PIC """
         if not telepon_pic:
             return False, "Nomor HP PIC tidak boleh kosong"
-            
-        # Remove all non-digits first untuk checking
-        clean_phone = re.sub(r'\D', '', telepon_pic)
-        original = telepon_pic.strip()
-        
-        # Indonesian phone patterns dengan prefix yang valid
-        patterns = [
-            r'^08[1-9]\d{7,10}$',      # 08xx format (081x, 082x, dst - bukan 080x)
-            r'^628[1-9]\d{7,10}$',     # 628xx format  
-            r'^\+628[1-9]\d{7,10}$'    # +628xx format
-        ]
-        
-        # Check original format first (dengan spasi dan dash dihilangkan)
-        clean_original = original.replace(' ', '').replace('-', '')
-        for pattern in patterns:
-            if re.match(pattern, clean_original):
-                logger.info(f"Phone PIC validated (original format): {original}")
-                return True, original
-        
-        # Auto-format hanya jika nomor dimulai dengan digit yang valid untuk Indonesia
-        if len(clean_phone) >= 10:
-            # Jika dimulai dengan 8, tambahkan 0 di depan (misal: 81234567890 -> 081234567890)
-            if clean_phone.startswith('8') and clean_phone[1] in '123456789':
-                formatted = '0' + clean_phone
-                # Validasi ulang dengan pattern
-                for pattern in patterns:
-                    if re.match(pattern, formatted):
-                        logger.info(f"Phone PIC validated (auto-formatted): {formatted}")
-                        return True, formatted
-            
-            # Jika sudah dimulai dengan 08, 628, cek apakah valid
-            elif clean_phone.startswith('08') or clean_phone.startswith('628'):
-                for pattern in patterns:
-                    if re.match(pattern, clean_phone):
-                        logger.info(f"Phone PIC validated (clean): {clean_phone}")
-                        return True, clean_phone
-        
-        return False, "Format nomor HP PIC tidak valid. Contoh: 081234567890, +6281234567890"
+        
+        phone = normalize_phone(telepon_pic)
+        if phone is None:
+            return False, "Format nomor HP PIC tidak valid. Contoh: 081234567890, +6281234567890"
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Phone PIC validated: {phone}")
+        return True, phone
     
     @staticmethod
     def validate_bundling(bundling):
@@ -402,62 +370,26 @@ class DataValidator:
         
         bundling = bundling.strip()
         
-        valid_bundling = [
-            '1P Internet Only',
-            '2P Internet + TV',
-            '2P Internet + Telepon',
-            '3P Internet + TV + Telepon'
-        ]
-        
-        if bundling in valid_bundling:
-            logger.info(f"Bundling validated: {bundling}")
+        if bundling in BUNDLING_SET:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Bundling validated: {bundling}")
             return True, bundling
         
-        return False, f"Deal Bundling tidak valid. Pilihan: {', '.join(valid_bundling)}"
+        return False, f"Deal Bundling tidak valid. Pilihan: {', '.join(BUNDLING_OPTIONS)}"
     
     @staticmethod
     def validate_all_data(data):
         """Validasi semua data sekaligus untuk final check"""
-        errors = []
-        validated_data = {}
-        
-        # Required fields dan validator mapping
-        field_validators = {
-            'kode_sa': DataValidator.validate_kode_sa,
-            'nama': DataValidator.validate_nama,
-            'no_telp': DataValidator.validate_telepon,
-            'witel': DataValidator.validate_witel,
-            'telda': DataValidator.validate_telda,
-            'tanggal': DataValidator.validate_tanggal,
-            'kategori': DataValidator.validate_kategori,
-            'kegiatan': DataValidator.validate_kegiatan,
-            'layanan': DataValidator.validate_layanan,
-            'tarif': DataValidator.validate_tarif,
-            'nama_pic': DataValidator.validate_nama_pic,
-            'jabatan_pic': DataValidator.validate_jabatan_pic,
-            'telepon_pic': DataValidator.validate_telepon_pic
-        }
-        
-        # Validate each field
-        for field, validator in field_validators.items():
-            value = data.get(field)
-            
-            if not value:
-                errors.append(f"{field} tidak boleh kosong")
-                continue
-            
-            is_valid, result = validator(value)
-            
-            if is_valid:
-                validated_data[field] = result
-            else:
-                errors.append(f"{field}: {result}")
+        # Imported here: form_schema is built on top of this module
+        from form_schema import validate_form
+
+        errors, validated_data = validate_form(data)
         
         if errors:
             logger.warning(f"Validation errors: {errors}")
             return False, errors
         
-        logger.info("All data validated successfully")
+        logger.debug("All data validated successfully")
         return True, validated_data
     
     @staticmethod
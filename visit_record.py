@@ -0,0 +1,98 @@
+from spreadsheet import ROW_FIELDS
+
+class VisitRecord:
+    """Slotted visit/dealing record with a fixed field set in HEADER_DATA order.
+
+    Behaves like the old 17-key session dict (get, [], pop, in, keys/values/items),
+    while tracking which fields are filled in a bitmask so progress checks are O(1).
+    """
+    FIELDS = ROW_FIELDS
+    _BITS = {field: 1 << index for index, field in enumerate(ROW_FIELDS)}
+    _ALL_FILLED = (1 << len(ROW_FIELDS)) - 1
+
+    __slots__ = ROW_FIELDS + ('_filled',)
+
+    def __init__(self, **values):
+        object.__setattr__(self, '_filled', 0)
+        for field in self.FIELDS:
+            object.__setattr__(self, field, None)
+        for field, value in values.items():
+            self[field] = value
+
+    def __setattr__(self, name, value):
+        bit = self._BITS.get(name)
+        if bit is None:
+            raise AttributeError(f"VisitRecord has no field '{name}'")
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, '_filled', self._filled | bit if value else self._filled & ~bit)
+
+    # ========== DICT-LIKE ACCESS ==========
+
+    def __getitem__(self, key):
+        if key not in self._BITS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._BITS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._BITS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def get(self, key, default=None):
+        """Field value, or default when the field is unknown or still empty (None)"""
+        if key not in self._BITS:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def pop(self, key, default=None):
+        """Return the field value and clear it"""
+        value = self.get(key, default)
+        if key in self._BITS:
+            setattr(self, key, None)
+        return value
+
+    def keys(self):
+        return self.FIELDS
+
+    def values(self):
+        return [getattr(self, field) for field in self.FIELDS]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.FIELDS]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    # ========== PROGRESS ==========
+
+    def filled_count(self):
+        return self._filled.bit_count()
+
+    def is_filled(self, key):
+        return bool(self._filled & self._BITS[key])
+
+    def is_complete(self):
+        return self._filled == self._ALL_FILLED
+
+    # ========== SERIALISATION ==========
+
+    def to_row(self, image_link=None):
+        """Row in HEADER_DATA order with empty fields as '-'; the photo link (17) is added only when given"""
+        row = [getattr(self, field) or '-' for field in self.FIELDS[:-1]]
+        if image_link is not None:
+            row.append(image_link)
+        return row
+
+    def __repr__(self):
+        filled = ', '.join(f"{field}={getattr(self, field)!r}" for field in self.FIELDS if self._filled & self._BITS[field] and field != 'foto_evidence')
+        return f"VisitRecord({filled})"
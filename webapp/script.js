@@ -12,6 +12,16 @@ let formData = {};
 let photoFile = null;
 let totalSteps = 15;
 let isSubmitting = false;
+// Sent with every submit; kept across retries so the server can drop duplicates
+let submissionUuid = newSubmissionUuid();
+
+function newSubmissionUuid() {
+    if (window.crypto?.randomUUID) return window.crypto.randomUUID();
+    return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, c => {
+        const r = Math.random() * 16 | 0;
+        return (c === 'x' ? r : (r & 0x3 | 0x8)).toString(16);
+    });
+}
 
 // ========== APP INITIALIZATION ==========
 document.addEventListener('DOMContentLoaded', function() {
@@ -235,6 +245,7 @@ function backToMenu() {
         currentActivity = '';
         formData = {};
         photoFile = null;
+        submissionUuid = newSubmissionUuid();
         window.scrollTo({ top: 0, behavior: 'smooth' });
     }, 300);
 }
@@ -387,7 +398,51 @@ function clearAllErrors() {
 }
 
 // ========== PHOTO HANDLING ==========
-function handlePhotoUpload(event) {
+// Photos are downscaled and re-encoded on the device before upload; phone camera files shrink ~10x
+const PHOTO_MAX_DIMENSION = 1600;
+const PHOTO_QUALITY = 0.8;
+const PHOTO_MAX_SOURCE_SIZE = 25 * 1024 * 1024;
+const PHOTO_MAX_UPLOAD_SIZE = 5 * 1024 * 1024;
+let photoPreviewUrl = null;
+
+async function loadPhotoBitmap(file) {
+    if (window.createImageBitmap) {
+        try {
+            return await createImageBitmap(file, { imageOrientation: 'from-image' });
+        } catch (error) {
+            console.warn('createImageBitmap failed, falling back to <img>:', error);
+        }
+    }
+    const url = URL.createObjectURL(file);
+    try {
+        const img = new Image();
+        img.src = url;
+        await img.decode();
+        return img;
+    } finally {
+        URL.revokeObjectURL(url);
+    }
+}
+
+async function downscalePhoto(file) {
+    const bitmap = await loadPhotoBitmap(file);
+    const width = bitmap.width || bitmap.naturalWidth;
+    const height = bitmap.height || bitmap.naturalHeight;
+    const scale = Math.min(1, PHOTO_MAX_DIMENSION / Math.max(width, height));
+
+    const canvas = document.createElement('canvas');
+    canvas.width = Math.round(width * scale);
+    canvas.height = Math.round(height * scale);
+    canvas.getContext('2d').drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+    if (bitmap.close) bitmap.close();
+
+    const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', PHOTO_QUALITY));
+    // Keep the original when re-encoding doesn't help (small or already compressed photos)
+    if (!blob || blob.size >= file.size) return file;
+    return new File([blob], file.name.replace(/\.[^.]*$/, '') + '.jpg', { type: 'image/jpeg' });
+}
+
+async function handlePhotoUpload(event) {
     const file = event.target.files[0];
     const preview = document.getElementById('photoPreview');
     const previewImg = document.getElementById('previewImg');
@@ -395,46 +450,54 @@ function handlePhotoUpload(event) {
     const errorElement = document.getElementById('error_foto_evidence');
     if (!file) return;
 
-    const maxSize = 5 * 1024 * 1024;
     const allowedTypes = ['image/jpeg', 'image/jpg', 'image/png', 'image/webp'];
     if (!allowedTypes.includes(file.type)) {
         showError(errorElement, 'Format file tidak didukung. Gunakan JPG, PNG, JPEG atau WebP');
         event.target.value = '';
         return;
     }
-    if (file.size > maxSize) {
-        showError(errorElement, 'Ukuran file terlalu besar. Maksimal 5MB');
+    if (file.size > PHOTO_MAX_SOURCE_SIZE) {
+        showError(errorElement, 'Ukuran file terlalu besar. Maksimal 25MB');
         event.target.value = '';
         return;
     }
 
     clearError(event.target);
-    const reader = new FileReader();
-    reader.onload = function(e) {
-        uploadPrompt.style.transition = 'all 0.3s ease';
-        uploadPrompt.style.opacity = '0';
-        uploadPrompt.style.transform = 'scale(0.9)';
-        setTimeout(() => {
-            uploadPrompt.style.display = 'none';
-            previewImg.src = e.target.result;
-            preview.style.display = 'block';
-            preview.style.opacity = '0';
-            preview.style.transform = 'scale(0.9)';
-            setTimeout(() => {
-                preview.style.transition = 'all 0.3s ease';
-                preview.style.opacity = '1';
-                preview.style.transform = 'scale(1)';
-            }, 50);
-        }, 300);
-        photoFile = file;
-        updateProgress();
-        hapticFeedback('medium');
-    };
-    reader.onerror = function() {
-        showError(errorElement, 'Gagal membaca file. Coba lagi');
+    let photo;
+    try {
+        photo = await downscalePhoto(file);
+    } catch (error) {
+        console.warn('Photo downscale failed, using original:', error);
+        photo = file;
+    }
+    if (photo.size > PHOTO_MAX_UPLOAD_SIZE) {
+        showError(errorElement, 'Ukuran file terlalu besar. Maksimal 5MB');
         event.target.value = '';
-    };
-    reader.readAsDataURL(file);
+        return;
+    }
+
+    // Object URL instead of a base64 data URL: no multi-megabyte string in memory
+    if (photoPreviewUrl) URL.revokeObjectURL(photoPreviewUrl);
+    photoPreviewUrl = URL.createObjectURL(photo);
+
+    uploadPrompt.style.transition = 'all 0.3s ease';
+    uploadPrompt.style.opacity = '0';
+    uploadPrompt.style.transform = 'scale(0.9)';
+    setTimeout(() => {
+        uploadPrompt.style.display = 'none';
+        previewImg.src = photoPreviewUrl;
+        preview.style.display = 'block';
+        preview.style.opacity = '0';
+        preview.style.transform = 'scale(0.9)';
+        setTimeout(() => {
+            preview.style.transition = 'all 0.3s ease';
+            preview.style.opacity = '1';
+            preview.style.transform = 'scale(1)';
+        }, 50);
+    }, 300);
+    photoFile = photo;
+    updateProgress();
+    hapticFeedback('medium');
 }
 
 function removePhoto(event) {
@@ -461,6 +524,10 @@ function removePhoto(event) {
     }, 300);
     fileInput.value = '';
     photoFile = null;
+    if (photoPreviewUrl) {
+        URL.revokeObjectURL(photoPreviewUrl);
+        photoPreviewUrl = null;
+    }
     updateProgress();
     hapticFeedback('light');
 }
@@ -517,7 +584,11 @@ function handleFormSubmit(event) {
 
 async function submitData(form) {
     const payload = new FormData(form);
+    // The downscaled photo replaces the original file picked in the input
+    payload.set('foto_evidence', photoFile, photoFile.name);
+    payload.append('submission_uuid', submissionUuid);
     let isSuccess = false;
+    let validationErrors = null;
 
     try {
         const res = await fetch('/api/append-to-sheet', {
@@ -527,10 +598,19 @@ async function submitData(form) {
 
         if (!res.ok) {
             const errorBody = await res.text();
+            // 400 carries the server-side validation messages
+            if (res.status === 400) {
+                try {
+                    validationErrors = JSON.parse(errorBody).errors || null;
+                } catch (parseError) {
+                    validationErrors = null;
+                }
+            }
             throw new Error(errorBody);
         }
 
         isSuccess = true;
+        notifyBot(await res.json(), payload);
     } catch (err) {
         console.error('Submit error:', err);
     }
@@ -549,12 +629,17 @@ async function submitData(form) {
         }, 200);
 
         if (isSuccess) {
+            // Next submit is a new record; a failed one keeps its uuid so a retry is deduplicated
+            submissionUuid = newSubmissionUuid();
             showModal(
                 '✅',
                 'Data Berhasil Disimpan!',
                 `Data ${currentActivity} telah berhasil disimpan ke sistem RLEGS.`
             );
             hapticFeedback('success');
+        } else if (validationErrors && validationErrors.length) {
+            showModal('❌', 'Validasi Gagal', validationErrors.join('; '));
+            hapticFeedback('heavy');
         } else {
             showModal(
                 '❌',
@@ -566,6 +651,18 @@ async function submitData(form) {
     }, 1000);
 }
 
+// Opened from a reply keyboard button: let the bot report progress in the chat.
+// Only a reference goes through web_app_data; the data and photo were already uploaded above.
+function notifyBot(result, payload) {
+    if (!tg?.sendData || tg.initDataUnsafe?.query_id || !result.submission_id) return;
+    tg.sendData(JSON.stringify({
+        submission_id: result.submission_id,
+        submission_uuid: submissionUuid,
+        kode_sa: payload.get('kode_sa'),
+        kegiatan: payload.get('kegiatan')
+    }));
+}
+
 // ========== MODAL HANDLING ==========
 function showModal(icon, title, message) {
     const modal = document.getElementById('messageModal');
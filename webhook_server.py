@@ -0,0 +1,78 @@
+import hmac
+import logging
+import config
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from telegram import Update
+from telegram.error import TelegramError
+
+logger = logging.getLogger(__name__)
+
+def create_webhook_app():
+    """ASGI app serving Telegram webhook updates plus the mini app static files and API"""
+    # Imported here so every uvicorn worker builds its own Application and handlers
+    import main
+    from async_api_server import create_async_app
+
+    application = main.build_application(webhook=True)
+    api_app = create_async_app()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await application.initialize()
+        try:
+            # Every replica registers the same URL, so this is idempotent
+            await application.bot.set_webhook(
+                url=f"{config.WEBHOOK_URL}{config.WEBHOOK_PATH}",
+                secret_token=config.WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            )
+        except TelegramError as e:
+            logger.error(f"Could not set webhook: {e}")
+        await application.start()
+        logger.info(f"Webhook mode: receiving updates on {config.WEBHOOK_PATH}")
+
+        # A mounted app gets no lifespan events of its own; run the API's around ours
+        async with api_app.router.lifespan_context(api_app):
+            yield
+
+        await application.stop()
+        await application.shutdown()
+
+    app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+
+    @app.post(config.WEBHOOK_PATH)
+    async def telegram_webhook(request: Request):
+        if config.WEBHOOK_SECRET:
+            token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+            if not hmac.compare_digest(token, config.WEBHOOK_SECRET):
+                return Response(status_code=403)
+
+        update = Update.de_json(await request.json(), application.bot)
+        # Hand off to the Application's queue and answer Telegram right away
+        await application.update_queue.put(update)
+        return Response(status_code=200)
+
+    # Mini app static files and /api routes
+    app.mount('/', api_app)
+
+    return app
+
+def run():
+    import uvicorn
+
+    if not config.WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL must be set when BOT_MODE=webhook")
+    if not config.WEBHOOK_SECRET:
+        logger.warning("WEBHOOK_SECRET is not set; webhook requests will not be verified")
+
+    uvicorn.run(
+        "webhook_server:create_webhook_app",
+        factory=True,
+        host=config.WEBHOOK_HOST,
+        port=config.WEBHOOK_PORT,
+        workers=config.WEBHOOK_WORKERS,
+        proxy_headers=True,
+    )